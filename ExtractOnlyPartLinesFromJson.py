@@ -1,12 +1,12 @@
-import json
+import orjson
 
 INPUT_FILE = "Classification Results/Panamera_S_GTS_Turbo_S_EHybrid_S_EHybrid/Panamera_S_GTS_Turbo_S_EHybrid_S_EHybrid_classified.json"   # קובץ המקור
 OUTPUT_FILE = "Panamera_only_parts.json"                                  # קובץ חדש שמכיל רק PARTS
 
 def extract_parts_only(input_path, output_path):
     # טען את הקובץ
-    with open(input_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(input_path, "rb") as f:
+        data = orjson.loads(f.read())
 
     services = data.get("services", {})
 
@@ -31,8 +31,8 @@ def extract_parts_only(input_path, output_path):
     }
 
     # כתיבת הקובץ החדש
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(output_data, f, indent=2, ensure_ascii=False)
+    with open(output_path, "wb") as f:
+        f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
 
     print(f"✅ קובץ חדש נוצר: {output_path}")
 
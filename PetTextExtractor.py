@@ -1,149 +1,177 @@
 import pdfplumber
-import json
+import orjson
+import os
 import re
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 
-def extract_with_accurate_columns(pdf_path, output_json_path=None):
+# גבולות X של העמודות - np.digitize ממפה כל x0 לאינדקס עמודה 0..6
+COLUMN_BOUNDS = np.array([85, 130, 210, 380, 465, 510], dtype=np.float64)
+COLUMN_NAMES = ("Ill-No.", "Pos", "Part Number", "Description", "Remark", "Qty", "Model")
+
+# עמודות שממשיכות בשורות continuation (Description, Remark, Model)
+CONTINUATION_COLUMNS = (3, 4, 6)
+
+# Ill-No. בתחילת שורה חדשה (למשל 101-000)
+_ILL_NO_RE = re.compile(r'^\d{3}-\d{3}$')
+
+
+def _extract_page(pdf_path, page_index):
     """
-    חילוץ מדויק עם גבולות עמודות מדויקים - ללא OCR!
+    חילוץ עמוד בודד (פותח את ה-PDF מקומית כדי שיהיה אפשר להריץ ב-worker נפרד)
     """
-
     with pdfplumber.open(pdf_path) as pdf:
-        page = pdf.pages[0]
+        return _parse_page(pdf.pages[page_index], page_index)
+
 
-        # חלץ מילים (טקסט ישיר מה-PDF, לא OCR!)
-        words = page.extract_words(x_tolerance=3, y_tolerance=3)
+def _parse_page(page, page_index):
+    """
+    פירוק עמוד פתוח לשורות
+
+    החזר: (leading_parts, rows_parts)
+    leading_parts - מילות continuation שלפני השורה החדשה הראשונה בעמוד
+                    (המשך של שורה מהעמוד הקודם), או None
+    rows_parts    - רשימת מילים לפי עמודה לכל שורה שמתחילה בעמוד
+    """
+    # חלץ מילים (טקסט ישיר מה-PDF, לא OCR!)
+    words = page.extract_words(x_tolerance=3, y_tolerance=3)
+
+    # עמודה ומיקום לכל המילים בבת אחת (וקטורי)
+    xs = np.fromiter((w['x0'] for w in words), dtype=np.float64, count=len(words))
+    ys = np.round(np.fromiter((w['top'] for w in words), dtype=np.float64, count=len(words)))
+    cols = np.digitize(xs, COLUMN_BOUNDS).tolist()
+
+    # מיין לפי Y ואז X, וקבץ לשורות לפי Y
+    sorted_rows = []
+    prev_y = None
+    for i in np.lexsort((xs, ys)).tolist():
+        y = ys[i]
+        if y != prev_y:
+            sorted_rows.append((y, []))
+            prev_y = y
+        sorted_rows[-1][1].append((cols[i], words[i]))
+
+    # מצא header
+    header_idx = None
+    for i, (y, row_words) in enumerate(sorted_rows):
+        text = " ".join([w['text'] for _, w in row_words])
+        if "Ill-No." in text and "Pos" in text:
+            header_idx = i
+            break
+
+    if page_index == 0:
+        print(f"Header נמצא בשורה {header_idx}")
 
-        # קבץ לפי Y
-        rows = {}
-        for word in words:
-            y = round(word['top'])
-            if y not in rows:
-                rows[y] = []
-            rows[y].append(word)
+    # עבור על שורות הנתונים
+    leading_parts = None
+    rows_parts = []
+    current_parts = None
+    first_data_row = header_idx + 1 if header_idx is not None else 0
+
+    for i in range(first_data_row, len(sorted_rows)):
+        y, row_words = sorted_rows[i]
+
+        if not row_words:
+            continue
+
+        # בדוק אם זו שורה חדשה (מתחילה עם Ill-No. ב-X=23)
+        first_word = row_words[0][1]
+        is_new_row = (first_word['x0'] < 30 and
+                      _ILL_NO_RE.match(first_word['text']))
+
+        # אותו פירוק לעמודות לשורה חדשה ול-continuation
+        row_parts = parse_row_accurate(row_words)
+
+        if is_new_row:
+            current_parts = row_parts
+            rows_parts.append(current_parts)
+        else:
+            # זו continuation - בתחילת עמוד (לא בעמוד הראשון) היא שייכת לשורה מהעמוד הקודם
+            if current_parts is None:
+                if page_index == 0:
+                    continue
+                if leading_parts is None:
+                    leading_parts = [[] for _ in COLUMN_NAMES]
+                target = leading_parts
+            else:
+                target = current_parts
 
-        # מיין
-        for y in rows:
-            rows[y] = sorted(rows[y], key=lambda w: w['x0'])
+            # צרף לפי עמודה (Ill-No. / Pos / Part Number / Qty - לא צריך)
+            extend_continuation(target, row_parts)
 
-        sorted_rows = sorted(rows.items(), key=lambda r: r[0])
+    return leading_parts, rows_parts
 
-        # מצא header
-        header_idx = None
-        for i, (y, row_words) in enumerate(sorted_rows):
-            text = " ".join([w['text'] for w in row_words])
-            if "Ill-No." in text and "Pos" in text:
-                header_idx = i
-                break
 
-        print(f"Header נמצא בשורה {header_idx}")
+def extract_with_accurate_columns(pdf_path, output_json_path=None, max_workers=1):
+    """
+    חילוץ מדויק עם גבולות עמודות מדויקים - ללא OCR!
+    ברירת מחדל: כל העמודים בתהליך הנוכחי (בטוח לקריאה מתוך worker של Celery)
+    max_workers > 1 - העמודים במקביל, תהליך לכל עמוד (להרצה ישירה, ראה __main__)
+    """
 
-        # עבור על שורות הנתונים
-        result_list = []
-        current_row = None
+    with pdfplumber.open(pdf_path) as pdf:
+        n_pages = len(pdf.pages)
+        if n_pages <= 1 or not max_workers or max_workers <= 1:
+            pages = [_parse_page(page, page_index) for page_index, page in enumerate(pdf.pages)]
+        else:
+            pages = None
 
-        for i in range(header_idx + 1, len(sorted_rows)):
-            y, row_words = sorted_rows[i]
+    if pages is None:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pages = list(executor.map(partial(_extract_page, pdf_path), range(n_pages)))
 
-            if not row_words:
-                continue
+    # מיזוג לפי סדר העמודים; continuation בתחילת עמוד מצטרף לשורה האחרונה
+    all_rows_parts = []
+    for leading_parts, rows_parts in pages:
+        if leading_parts and all_rows_parts:
+            extend_continuation(all_rows_parts[-1], leading_parts)
+        all_rows_parts.extend(rows_parts)
 
-            # בדוק אם זו שורה חדשה (מתחילה עם Ill-No. ב-X=23)
-            first_word = row_words[0]
-            is_new_row = (first_word['x0'] < 30 and
-                          re.match(r'^\d{3}-\d{3}$', first_word['text']))
+    result_list = [build_row_dict(parts) for parts in all_rows_parts]
 
-            if is_new_row:
-                # שמור שורה קודמת
-                if current_row:
-                    result_list.append(current_row)
+    # שמור
+    if output_json_path:
+        with open(output_json_path, 'wb') as f:
+            f.write(orjson.dumps(result_list, option=orjson.OPT_INDENT_2))
+        print(f"\n✓ נשמר ל: {output_json_path}")
 
-                # פרוק שורה חדשה
-                current_row = parse_row_accurate(row_words)
-            else:
-                # זו continuation
-                if current_row:
-                    # צרף לפי X
-                    for word in row_words:
-                        x = word['x0']
-                        text = word['text']
-
-                        if x < 85:  # Ill-No. - לא צריך
-                            pass
-                        elif x < 130:  # Pos - לא צריך
-                            pass
-                        elif x < 210:  # Part Number - לא צריך
-                            pass
-                        elif x < 380:  # Description
-                            if current_row["Description"]:
-                                current_row["Description"] += " " + text
-                            else:
-                                current_row["Description"] = text
-                        elif x < 465:  # Remark
-                            if current_row["Remark"]:
-                                current_row["Remark"] += " " + text
-                            else:
-                                current_row["Remark"] = text
-                        elif x < 510:  # Qty - לא צריך
-                            pass
-                        else:  # Model
-                            if current_row["Model"]:
-                                current_row["Model"] += " " + text
-                            else:
-                                current_row["Model"] = text
-
-        # שמור שורה אחרונה
-        if current_row:
-            result_list.append(current_row)
-
-        # שמור
-        if output_json_path:
-            with open(output_json_path, 'w', encoding='utf-8') as f:
-                json.dump(result_list, f, ensure_ascii=False, indent=2)
-            print(f"\n✓ נשמר ל: {output_json_path}")
-
-        print(f"✓ חולצו {len(result_list)} שורות")
-        return result_list
+    print(f"✓ חולצו {len(result_list)} שורות")
+    return result_list
 
 
 def parse_row_accurate(row_words):
     """
     פרוק שורה עם גבולות מדויקים
+    row_words: רשימת (אינדקס עמודה, מילה) ממוינת לפי X
+    החזר: רשימת מילים לכל עמודה (לפי COLUMN_NAMES)
+    """
+    column_parts = [[] for _ in COLUMN_NAMES]
+
+    for col, word in row_words:
+        column_parts[col].append(word['text'])
+
+    return column_parts
+
+
+def extend_continuation(column_parts, continuation_parts):
+    """
+    צרף מילות continuation לשורה - רק לעמודות שממשיכות (Description, Remark, Model)
+    """
+    for col in CONTINUATION_COLUMNS:
+        column_parts[col].extend(continuation_parts[col])
+
+
+def build_row_dict(column_parts):
+    """
+    חבר את המילים של כל עמודה למחרוזת אחת (join אחד במקום += לכל מילה)
     """
     row_dict = {
-        "Ill-No.": "",
-        "Pos": "",
-        "Part Number": "",
-        "Description": "",
-        "Remark": "",
-        "Qty": "",
-        "Model": ""
+        name: " ".join(parts).strip()
+        for name, parts in zip(COLUMN_NAMES, column_parts)
     }
 
-    for word in row_words:
-        x = word['x0']
-        text = word['text']
-
-        # זהה לפי X
-        if x < 85:  # Ill-No.
-            row_dict["Ill-No."] += text + " "
-        elif x < 130:  # Pos
-            row_dict["Pos"] += text + " "
-        elif x < 210:  # Part Number (6 מילים)
-            row_dict["Part Number"] += text + " "
-        elif x < 380:  # Description
-            row_dict["Description"] += text + " "
-        elif x < 465:  # Remark
-            row_dict["Remark"] += text + " "
-        elif x < 510:  # Qty
-            row_dict["Qty"] += text + " "
-        else:  # Model
-            row_dict["Model"] += text + " "
-
-    # נקה רווחים
-    for key in row_dict:
-        row_dict[key] = row_dict[key].strip()
-
     # נקה Pos מסוגריים
     if row_dict["Pos"]:
         row_dict["Pos"] = row_dict["Pos"].replace("(", "").replace(")", "")
@@ -151,8 +179,26 @@ def parse_row_accurate(row_words):
     return row_dict
 
 
+def _extract_pet_file(pdf_path, output_folder, max_workers=1):
+    """חילוץ קובץ PET אחד לתיקיית הפלט, מחזיר את נתיב הפלט"""
+    file_name = os.path.basename(pdf_path)
+
+    # הוצאת שם ללא הסיומת
+    base_name = file_name.replace(".pdf", "")
+
+    # הורדת " - PET File" אם קיים
+    clean_name = base_name.replace(" - PET File", "").strip()
+
+    # יצירת שם פלט
+    output_name = f"{clean_name} PET lines.json"
+    output_path = os.path.join(output_folder, output_name)
+
+    print(f"⏳ מעבד: {file_name}")
+    extract_with_accurate_columns(pdf_path, output_path, max_workers=max_workers)
+    return output_path
+
+
 if __name__ == "__main__":
-    import os
     import glob
 
     # בקשת תיקיית קלט מהמשתמש
@@ -175,21 +221,16 @@ if __name__ == "__main__":
 
     print(f"\n✓ נמצאו {len(pdf_files)} קבצים. מתחיל עיבוד...\n")
 
-    for pdf_path in pdf_files:
-        file_name = os.path.basename(pdf_path)
-
-        # הוצאת שם ללא הסיומת
-        base_name = file_name.replace(".pdf", "")
-
-        # הורדת " - PET File" אם קיים
-        clean_name = base_name.replace(" - PET File", "").strip()
-
-        # יצירת שם פלט
-        output_name = f"{clean_name} PET lines.json"
-        output_path = os.path.join(output_folder, output_name)
-
-        print(f"⏳ מעבד: {file_name}")
-        rows = extract_with_accurate_columns(pdf_path, output_path)
+    if len(pdf_files) > 1:
+        # תהליך לכל קובץ; העמודים של כל קובץ בתוך התהליך שלו (בלי pool מקונן)
+        with ProcessPoolExecutor(max_workers=min(len(pdf_files), os.cpu_count() or 1)) as executor:
+            output_paths = executor.map(partial(_extract_pet_file, output_folder=output_folder),
+                                        pdf_files)
+            for output_path in output_paths:
+                print(f"✅ נשמר: {output_path}\n")
+    else:
+        # קובץ יחיד - העמודים שלו במקביל
+        output_path = _extract_pet_file(pdf_files[0], output_folder, max_workers=os.cpu_count() or 1)
         print(f"✅ נשמר: {output_path}\n")
 
     print("\n🎉 הסתיים! כל הפלטים נמצאים בתיקייה:")
@@ -6,10 +6,19 @@ SmartVinDecoder.py
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
-import pickle
+import joblib
 import os
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+
+def _build_feature_lut() -> np.ndarray:
+    """טבלת המרה byte -> feature: ספרה = ערכה, אות = 10..35 (ללא תלות ברישיות), אחר = 0"""
+    lut = np.zeros(256, dtype=np.int8)
+    lut[ord('0'):ord('9') + 1] = np.arange(0, 10)
+    lut[ord('A'):ord('Z') + 1] = np.arange(10, 36)
+    lut[ord('a'):ord('z') + 1] = np.arange(10, 36)
+    return lut
+
 
 class SmartVinDecoder:
     """
@@ -22,14 +31,23 @@ class SmartVinDecoder:
 
     # מיפוי תו 10 ב-VIN לשנת ייצור
     YEAR_CODE = {
-        'A': 2010, 'B': 2011, 'Cayenne': 2012, 'D': 2013, 'E': 2014,
+        'A': 2010, 'B': 2011, 'C': 2012, 'D': 2013, 'E': 2014,
         'F': 2015, 'G': 2016, 'H': 2017, 'J': 2018, 'K': 2019,
-        'L': 2020, 'M': 2021, 'N': 2022, 'Panamera': 2023, 'R': 2024,
+        'L': 2020, 'M': 2021, 'N': 2022, 'P': 2023, 'R': 2024,
         'S': 2025, 'T': 2026, 'V': 2027, 'W': 2028, 'X': 2029,
         'Y': 2000, '1': 2001, '2': 2002, '3': 2003, '4': 2004,
         '5': 2005, '6': 2006, '7': 2007, '8': 2008, '9': 2009,
     }
 
+    # אותו מיפוי כטבלת byte -> שנה (-1 = לא ידוע)
+    _YEAR_LUT = np.full(256, -1, dtype=np.int16)
+    for _year_char, _year in YEAR_CODE.items():
+        _YEAR_LUT[ord(_year_char)] = _year
+    del _year_char, _year
+
+    # המרת תווי VIN ל-features בבת אחת (אינדקס לפי byte)
+    _FEATURE_LUT = _build_feature_lut()
+
     def __init__(self, excel_path: str = "VINS-and-Model-Descriptions-including-Model-Code-all-data.xlsx"):
         self.excel_path = excel_path
         self.model = None
@@ -37,6 +55,11 @@ class SmartVinDecoder:
         self.df = None
         self.code_to_desc = {}  # מיפוי קוד דגם -> תיאור
 
+        # trie של ה-VINs לחיפוש דמיון + הרשומות המקבילות
+        # נבנה בחיפוש הראשון (None = צריך לבנות מחדש מ-vin_database)
+        self._vin_entries = []
+        self._vin_trie = None
+
         # טעינה אוטומטית
         if os.path.exists(excel_path):
             self.load_data()
@@ -47,20 +70,68 @@ class SmartVinDecoder:
         self.df = pd.read_excel(self.excel_path)
         self.df['קוד דגם'] = self.df['קוד דגם'].astype(str)
 
-        # בניית מסד נתונים ישיר
-        for _, row in self.df.iterrows():
-            self.vin_database[row['מספר שלדה']] = {
-                'code': row['קוד דגם'],
-                'desc': row['תיאור דגם']
-            }
+        # בניית מסד נתונים ישיר - מעבר על עמודות (בלי Series לכל שורה)
+        vins = self.df['מספר שלדה'].tolist()
+        codes = self.df['קוד דגם'].tolist()
+        descs = self.df['תיאור דגם'].tolist()
+
+        self.vin_database.update(
+            (vin, {'code': code, 'desc': desc})
+            for vin, code, desc in zip(vins, codes, descs)
+        )
+
+        # מיפוי קוד דגם -> תיאור (לקחת את הראשון שנמצא)
+        for code, desc in zip(codes, descs):
+            self.code_to_desc.setdefault(code, desc)
 
-            # מיפוי קוד דגם -> תיאור (לקחת את הראשון שנמצא)
-            if row['קוד דגם'] not in self.code_to_desc:
-                self.code_to_desc[row['קוד דגם']] = row['תיאור דגם']
+        self._vin_trie = None
 
         print(f"   ✓ נטענו {len(self.vin_database)} שלדות")
         print(f"   ✓ {len(self.code_to_desc)} קודי דגם ייחודיים")
 
+    def _build_vin_index(self):
+        """
+        בונה את ה-trie של ה-VINs מ-vin_database (רק VINs באורך 17 לפחות)
+        """
+        known = [(vin, data) for vin, data in self.vin_database.items()
+                 if isinstance(vin, str) and len(vin) >= 17]
+        self._vin_entries = [data for _, data in known]
+
+        # trie של 17 התווים (dict של dicts); העלה מחזיק את אינדקס הרשומה הראשונה
+        self._vin_trie = {}
+        for idx, (vin, _) in enumerate(known):
+            node = self._vin_trie
+            for char in vin[:16]:
+                node = node.setdefault(char, {})
+            node.setdefault(vin[16], idx)
+
+    def _search_vin_trie(self, vin: str, max_mismatches: int) -> Optional[tuple]:
+        """
+        DFS חסום על ה-trie: VIN עם הכי מעט תווים שונים (עד max_mismatches)
+        בשוויון - הרשומה המוקדמת ביותר (כמו בסריקה הרגילה)
+
+        Returns:
+            (mismatches, index) או None
+        """
+        best = None
+        stack = [(self._vin_trie, 0, 0)]
+
+        while stack:
+            node, depth, mismatches = stack.pop()
+            if depth == 17:
+                if best is None or (mismatches, node) < best:
+                    best = (mismatches, node)
+                continue
+
+            char = vin[depth]
+            budget = max_mismatches if best is None else best[0]
+            for child_char, child in node.items():
+                child_mismatches = mismatches + (child_char != char)
+                if child_mismatches <= budget:
+                    stack.append((child, depth + 1, child_mismatches))
+
+        return best
+
     def train_model(self):
         """אימון מודל ML"""
         if self.df is None:
@@ -69,7 +140,7 @@ class SmartVinDecoder:
         print("\n🧠 אימון מודל ML...")
 
         # חילוץ features
-        X = np.array([self._extract_features(vin) for vin in self.df['מספר שלדה']])
+        X = self._encode_vins(self.df['מספר שלדה'])
         y = self.df['קוד דגם'].values
 
         # אימון
@@ -84,23 +155,34 @@ class SmartVinDecoder:
 
         print("   ✓ מודל אומן בהצלחה!")
 
-    def _extract_features(self, vin: str) -> list:
-        """מחלץ 17 features מ-VIN"""
-        if pd.isna(vin) or len(str(vin)) < 17:
-            return [0] * 17
+    def predict_batch(self, vins: List[str]) -> List[Tuple[str, float]]:
+        """
+        ניבוי קוד דגם לרשימת VINs בקריאת predict_proba אחת
+
+        Returns:
+            רשימת (קוד דגם, ביטחון באחוזים) לכל VIN
+        """
+        if self.model is None:
+            raise ValueError("יש לאמן או לטעון מודל תחילה")
 
-        vin_str = str(vin)[:17]
-        features = []
+        proba = self.model.predict_proba(self._encode_vins(vins))
+        best = proba.argmax(axis=1)
+        codes = self.model.classes_[best]
+        confidences = proba[np.arange(len(best)), best] * 100
 
-        for char in vin_str:
-            if char.isdigit():
-                features.append(int(char))
-            elif char.isalpha():
-                features.append(ord(char.upper()) - ord('A') + 10)
-            else:
-                features.append(0)
+        return list(zip(codes.tolist(), confidences.tolist()))
 
-        return features
+    def _encode_vins(self, vins: Sequence[str]) -> np.ndarray:
+        """
+        מקודד רשימת VINs למטריצת features (N, 17) בפעולה אחת
+        VIN חסר או קצר מ-17 תווים מקודד כאפסים
+        """
+        padded = ''.join(
+            '\0' * 17 if pd.isna(vin) or len(str(vin)) < 17 else str(vin)[:17]
+            for vin in vins
+        )
+        buf = np.frombuffer(padded.encode('ascii', errors='replace'), dtype=np.uint8)
+        return self._FEATURE_LUT[buf].reshape(-1, 17)
 
     @staticmethod
     def decode_year_from_vin(vin: str) -> Optional[int]:
@@ -116,8 +198,12 @@ class SmartVinDecoder:
         if not vin or len(vin) < 10:
             return None
 
-        year_char = vin[9].upper()
-        return SmartVinDecoder.YEAR_CODE.get(year_char)
+        # upper() יכול להחזיר יותר מתו אחד (למשל 'ß' -> 'SS')
+        char = vin[9].upper()
+        if len(char) != 1 or ord(char) > 255:
+            return None
+        year = int(SmartVinDecoder._YEAR_LUT[ord(char)])
+        return None if year < 0 else year
 
     @staticmethod
     def extract_model_family(vin: str) -> Optional[str]:
@@ -160,63 +246,79 @@ class SmartVinDecoder:
         Returns:
             dict עם: vin, model_code, model_description, model_family, year, confidence, source
         """
-        # חילוץ שנה
-        year = self.decode_year_from_vin(vin)
+        return self.decode_vins([vin])[0]
 
-        # שלב 1: Exact Match
-        if vin in self.vin_database:
-            return {
-                'vin': vin,
-                'model_code': self.vin_database[vin]['code'],
-                'model_description': self.vin_database[vin]['desc'],
-                'model_family': self._extract_family_from_description(self.vin_database[vin]['desc']),
-                'year': year,
-                'confidence': 100,
-                'source': 'exact_match'
-            }
+    def decode_vins(self, vins: List[str]) -> List[Dict]:
+        """
+        מזהה קוד דגם, תיאור ושנת ייצור לרשימת VINs
+        VINs שמגיעים לשלב ה-ML מנובאים יחד בקריאת predict_proba אחת
 
-        # שלב 2: Pattern Matching (VINs דומים)
-        similar = self._find_similar_vins(vin)
-        if similar:
-            return {
-                'vin': vin,
-                'model_code': similar['code'],
-                'model_description': similar['desc'],
-                'model_family': self._extract_family_from_description(similar['desc']),
-                'year': year,
-                'confidence': similar['confidence'],
-                'source': 'pattern_matching'
-            }
+        Args:
+            vins: רשימת מספרי VIN
 
-        # שלב 3: ML Prediction
-        if self.model:
-            features = np.array([self._extract_features(vin)])
-            predicted_code = self.model.predict(features)[0]
-            predicted_proba = self.model.predict_proba(features)[0]
-            confidence = max(predicted_proba) * 100
+        Returns:
+            רשימת dicts (באותו סדר) עם: vin, model_code, model_description,
+            model_family, year, confidence, source
+        """
+        results = [None] * len(vins)
+        ml_indices = []
+
+        for i, vin in enumerate(vins):
+            # חילוץ שנה
+            year = self.decode_year_from_vin(vin)
+
+            # שלב 1: Exact Match
+            if vin in self.vin_database:
+                known = self.vin_database[vin]
+                results[i] = self._decode_result(vin, known['code'], known['desc'], year,
+                                                 100, 'exact_match')
+                continue
 
-            # חיפוש תיאור לפי הקוד המנובא
-            description = self.code_to_desc.get(predicted_code, "Unknown Model")
+            # שלב 2: Pattern Matching (VINs דומים)
+            similar = self._find_similar_vins(vin)
+            if similar:
+                results[i] = self._decode_result(vin, similar['code'], similar['desc'], year,
+                                                 similar['confidence'], 'pattern_matching')
+                continue
 
-            return {
+            # שלב 3: ML Prediction - נאסף לניבוי משותף
+            if self.model:
+                ml_indices.append(i)
+                continue
+
+            # שלב 4: Fallback
+            results[i] = {
                 'vin': vin,
-                'model_code': predicted_code,
-                'model_description': description,
-                'model_family': self._extract_family_from_description(description),
+                'model_code': 'UNKNOWN',
+                'model_description': 'Unknown Model',
+                'model_family': None,
                 'year': year,
-                'confidence': round(confidence, 1),
-                'source': 'ml_prediction'
+                'confidence': 0,
+                'source': 'failed'
             }
 
-        # שלב 4: Fallback
+        if ml_indices:
+            predictions = self.predict_batch([vins[i] for i in ml_indices])
+            for i, (predicted_code, confidence) in zip(ml_indices, predictions):
+                # חיפוש תיאור לפי הקוד המנובא
+                description = self.code_to_desc.get(predicted_code, "Unknown Model")
+                results[i] = self._decode_result(vins[i], predicted_code, description,
+                                                 self.decode_year_from_vin(vins[i]),
+                                                 round(confidence, 1), 'ml_prediction')
+
+        return results
+
+    def _decode_result(self, vin: str, code, description, year: Optional[int],
+                       confidence, source: str) -> Dict:
+        """בונה את ה-dict של תוצאת זיהוי"""
         return {
             'vin': vin,
-            'model_code': 'UNKNOWN',
-            'model_description': 'Unknown Model',
-            'model_family': None,
+            'model_code': code,
+            'model_description': description,
+            'model_family': self._extract_family_from_description(description),
             'year': year,
-            'confidence': 0,
-            'source': 'failed'
+            'confidence': confidence,
+            'source': source
         }
 
     def _extract_family_from_description(self, description: str) -> Optional[str]:
@@ -242,21 +344,24 @@ class SmartVinDecoder:
         if len(vin) < 17:
             return None
 
-        best_match = None
-        best_similarity = 0
-
-        for known_vin, data in self.vin_database.items():
-            if len(known_vin) < 17:
-                continue
+        if self._vin_trie is None:
+            self._build_vin_index()
+        if not self._vin_entries:
+            return None
 
-            # חישוב דמיון
-            similarity = sum(1 for i in range(17) if i < len(vin) and i < len(known_vin) and vin[i] == known_vin[i])
+        max_mismatches = 17 - threshold
+        if max_mismatches < 0:
+            return None
 
-            if similarity >= threshold and similarity > best_similarity:
-                best_similarity = similarity
-                best_match = data
+        # הליכה חסומה על ה-trie במקום סריקת כל המסד
+        found = self._search_vin_trie(vin, max_mismatches)
+        if found is None:
+            return None
+        best_idx = found[1]
+        best_similarity = 17 - found[0]
 
-        if best_match:
+        if best_similarity >= threshold and best_similarity > 0:
+            best_match = self._vin_entries[best_idx]
             confidence = (best_similarity / 17) * 100
             return {
                 'code': best_match['code'],
@@ -267,24 +372,28 @@ class SmartVinDecoder:
         return None
 
     def save_model(self, path: str = "smart_vin_decoder.pkl"):
-        """שמירת המודל"""
+        """
+        שמירת המודל (joblib, ללא דחיסה - כדי שמערכי NumPy ימופו לזיכרון בטעינה)
+        """
         data = {
             'model': self.model,
             'database': self.vin_database,
             'code_to_desc': self.code_to_desc
         }
-        with open(path, 'wb') as f:
-            pickle.dump(data, f)
+        joblib.dump(data, path)
         print(f"✅ נשמר: {path}")
 
     def load_model(self, path: str = "smart_vin_decoder.pkl"):
-        """טעינת מודל שמור"""
+        """
+        טעינת מודל שמור - מערכי NumPy (עצי המודל) ממופים לזיכרון לקריאה בלבד
+        קובצי pickle ישנים נטענים גם הם
+        """
         if os.path.exists(path):
-            with open(path, 'rb') as f:
-                data = pickle.load(f)
+            data = joblib.load(path, mmap_mode='r')
             self.model = data['model']
             self.vin_database = data['database']
             self.code_to_desc = data.get('code_to_desc', {})
+            self._vin_trie = None
             print(f"✅ נטען: {path}")
         else:
             print(f"⚠️ קובץ לא נמצא: {path}")
@@ -313,8 +422,7 @@ if __name__ == "__main__":
     print("🔍 בדיקת VINs")
     print("="*70)
 
-    for vin in test_vins:
-        result = decoder.decode_vin(vin)
+    for result in decoder.decode_vins(test_vins):
         print(f"\n🚗 VIN: {result['vin']}")
         print(f"   📅 שנה: {result['year']}")
         print(f"   🏷️  משפחה: {result['model_family']}")
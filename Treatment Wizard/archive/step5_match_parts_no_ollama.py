@@ -22,7 +22,7 @@ from pathlib import Path
 from typing import Dict, List, Optional
 import json
 import re
-from difflib import SequenceMatcher
+from rapidfuzz import fuzz, process
 from collections import OrderedDict
 
 # Add foundation_codes to path
@@ -30,6 +30,12 @@ sys.path.insert(0, str(Path(__file__).parent.parent / 'foundation_codes'))
 
 from oil_capacity_config import get_oil_capacity
 
+# Precompiled patterns (clean_text runs for every service line x PET row pair)
+_RE_NONALNUM = re.compile(r"[^a-z0-9 ]+")
+_RE_SPACES = re.compile(r"\s+")
+_RE_X_VERSION = re.compile(r'x(\d+)')
+_RE_KM = re.compile(r'(\d+)\s*tkm')
+
 
 def sort_services_by_interval(services: Dict) -> Dict:
     """
@@ -42,33 +48,18 @@ def sort_services_by_interval(services: Dict) -> Dict:
     Returns:
         OrderedDict with sorted services
     """
-    # Separate time_dependent from km-based services
-    time_dependent = {}
-    km_services = {}
-
-    for key, value in services.items():
-        if "time-dependent" in key.lower() or "time dependent" in key.lower():
-            time_dependent[key] = value
-        else:
-            km_services[key] = value
-
-    # Sort km-based services by extracting the km number
-    def extract_km_from_header(header):
-        """Extract km value from header (e.g., 'Every 15 tkm...' → 15000)"""
-        match = re.search(r'(\d+)\s*tkm', header.lower())
+    def interval_key(item):
+        """Sort rank (is_time_dependent, km) - e.g. 'Every 15 tkm...' → (0, 15000)"""
+        header = item[0].lower()
+        if "time-dependent" in header or "time dependent" in header:
+            return (1, 0)
+        match = _RE_KM.search(header)
         if match:
-            return int(match.group(1)) * 1000
-        return 999999
-
-    sorted_km_services = OrderedDict(
-        sorted(km_services.items(), key=lambda x: extract_km_from_header(x[0]))
-    )
+            return (0, int(match.group(1)) * 1000)
+        return (0, 999999)
 
-    # Add time_dependent at the end
-    for key, value in time_dependent.items():
-        sorted_km_services[key] = value
-
-    return sorted_km_services
+    # Single stable sort: km-based services by km, time_dependent last (original order)
+    return OrderedDict(sorted(services.items(), key=interval_key))
 
 
 def clean_text(text: str) -> str:
@@ -82,8 +73,8 @@ def clean_text(text: str) -> str:
         Cleaned lowercase text
     """
     text = (text or "").lower()
-    text = re.sub(r"[^a-z0-9 ]+", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
+    text = _RE_NONALNUM.sub(" ", text)
+    text = _RE_SPACES.sub(" ", text).strip()
     return text
 
 
@@ -97,7 +88,7 @@ def extract_x_version(description: str) -> int:
     Returns:
         X version number or -1 if not found
     """
-    match = re.search(r'x(\d+)', description.lower())
+    match = _RE_X_VERSION.search(description.lower())
     if match:
         return int(match.group(1))
     return -1
@@ -114,11 +105,34 @@ def similarity_score(text1: str, text2: str) -> float:
     Returns:
         Similarity score (0.0 to 1.0)
     """
-    return SequenceMatcher(None, clean_text(text1), clean_text(text2)).ratio()
+    return fuzz.ratio(clean_text(text1), clean_text(text2)) / 100
+
+
+def _precompute_pet(pet_rows: List[Dict]) -> tuple:
+    """
+    Prepare PET rows once for all services (PET rows are static during matching)
+
+    Args:
+        pet_rows: List of PET parts
+
+    Returns:
+        (clean descriptions, clean remarks, engine oil flags) - lists aligned with pet_rows
+    """
+    descs_clean = [clean_text(row.get('Description', '')) for row in pet_rows]
+    remarks_clean = [clean_text(row.get('Remark', '')) for row in pet_rows]
+
+    # Rows eligible for the engine oil boost ("engine oil" but not an oil filter)
+    engine_oil_rows = []
+    for row in pet_rows:
+        desc_lower = row.get('Description', '').lower()
+        engine_oil_rows.append('engine oil' in desc_lower and 'filter' not in desc_lower)
+
+    return descs_clean, remarks_clean, engine_oil_rows
 
 
 def best_pet_match(service_line: str, pet_rows: List[Dict],
-                   model_name: str, min_score: float = 0.25) -> List[Dict]:
+                   model_name: str, min_score: float = 0.25,
+                   pet_clean: Optional[tuple] = None) -> List[Dict]:
     """
     Find best matching PET parts for a service line
 
@@ -127,30 +141,44 @@ def best_pet_match(service_line: str, pet_rows: List[Dict],
         pet_rows: List of PET parts
         model_name: Model name for filtering
         min_score: Minimum similarity score (default 0.25 for broader matches)
+        pet_clean: Output of _precompute_pet(pet_rows) (computed here if not given)
 
     Returns:
         List of matched parts (sorted by score)
     """
     matches = []
 
+    if pet_clean is None:
+        pet_clean = _precompute_pet(pet_rows)
+
+    descs_clean, remarks_clean, engine_oil_rows = pet_clean
+
     service_clean = clean_text(service_line)
     service_lower = service_line.lower()
-
-    for pet_row in pet_rows:
+    can_boost = 'engine oil' in service_lower or 'fill in' in service_lower
+
+    # Score the whole catalog in two C-level scans. Rows below both cutoffs
+    # cannot reach min_score (the engine oil boost adds at most 0.3, remarks weigh 0.5)
+    desc_cutoff = max(min_score - (0.3 if can_boost else 0.0), 0.0) * 100
+    desc_hits = {idx: score for _, score, idx in process.extract(
+        service_clean, descs_clean, scorer=fuzz.ratio, score_cutoff=desc_cutoff, limit=None)}
+    remark_hits = {idx: score for _, score, idx in process.extract(
+        service_clean, remarks_clean, scorer=fuzz.ratio, score_cutoff=min_score * 200, limit=None)}
+
+    for idx in sorted(desc_hits.keys() | remark_hits.keys()):
+        pet_row = pet_rows[idx]
         desc = pet_row.get('Description', '')
         remark = pet_row.get('Remark', '')
         part_num = pet_row.get('Part Number', '')
 
         # Special case: if service contains "engine oil" or "fill in", boost score if PET has "engine oil"
-        desc_lower = desc.lower()
         boost_score = 0.0
-        if ('engine oil' in service_lower or 'fill in' in service_lower):
-            if 'engine oil' in desc_lower and 'filter' not in desc_lower:
-                boost_score = 0.3  # Boost engine oil matches
+        if can_boost and engine_oil_rows[idx]:
+            boost_score = 0.3  # Boost engine oil matches
 
         # Calculate scores
-        desc_score = similarity_score(service_line, desc) + boost_score
-        remark_score = similarity_score(service_line, remark) * 0.5  # Lower weight
+        desc_score = desc_hits.get(idx, 0.0) / 100 + boost_score
+        remark_score = remark_hits.get(idx, 0.0) / 100 * 0.5  # Lower weight
 
         total_score = max(desc_score, remark_score)
 
@@ -169,25 +197,42 @@ def best_pet_match(service_line: str, pet_rows: List[Dict],
     return matches
 
 
-def apply_special_rules(service_line: str, model_name: str,
+def get_model_flags(model_name: str) -> Dict[str, bool]:
+    """
+    Model features used by the special rules (computed once per model)
+
+    Args:
+        model_name: Model name
+
+    Returns:
+        Dict with is_panamera, is_cayenne, is_perf (GTS/Turbo)
+    """
+    model_lower = model_name.lower()
+    return {
+        'is_panamera': 'panamera' in model_lower,
+        'is_cayenne': 'cayenne' in model_lower,
+        'is_perf': 'gts' in model_lower or 'turbo' in model_lower
+    }
+
+
+def apply_special_rules(service_line: str, model_flags: Dict[str, bool],
                         matches: List[Dict]) -> List[Dict]:
     """
     Apply special matching rules based on model and service type
 
     Args:
         service_line: Service line text
-        model_name: Model name
+        model_flags: Output of get_model_flags(model_name)
         matches: Initial matches
 
     Returns:
         List of matched parts (with additions for oil filter case)
     """
     service_lower = service_line.lower()
-    model_lower = model_name.lower()
 
     # Check if Panamera or Cayenne
-    is_panamera = 'panamera' in model_lower
-    is_cayenne = 'cayenne' in model_lower
+    is_panamera = model_flags['is_panamera']
+    is_cayenne = model_flags['is_cayenne']
     # Rule 1: Change oil filter - add drain plug and washer (Panamera/Cayenne only)
     if (is_panamera or is_cayenne) and "change oil filter" in service_lower:
         if matches:
@@ -274,7 +319,7 @@ def apply_special_rules(service_line: str, model_name: str,
                 x_versions.sort(key=lambda x: x[0], reverse=True)
 
                 # Prefer highest X version for performance models
-                if 'gts' in model_lower or 'turbo' in model_lower:
+                if model_flags['is_perf']:
                     return [x_versions[0][1]]  # Highest X
                 else:
                     return [x_versions[-1][1]]  # Lowest X
@@ -360,6 +405,12 @@ def match_parts_to_services(classified_data: Dict, pet_data: List[Dict],
         print("⚠️  No oil capacity defined for this model")
         oil_capacity = None
 
+    # Model feature flags for the special rules (same model for all services)
+    model_flags = get_model_flags(model_description)
+
+    # Preprocess the PET catalog once, shared by all services and items
+    pet_clean = _precompute_pet(pet_data)
+
     # Prepare output
     matched_data = {}
 
@@ -404,14 +455,16 @@ def match_parts_to_services(classified_data: Dict, pet_data: List[Dict],
             total_parts += 1
 
             # Find matches in PET
-            matches = best_pet_match(text, pet_data, model_name, min_score=0.3)
+            matches = best_pet_match(text, pet_data, model_name, min_score=0.3,
+                                     pet_clean=pet_clean)
 
             # Apply special rules
-            matches = apply_special_rules(text, model_name, matches)
+            matches = apply_special_rules(text, model_flags, matches)
 
             # Handle oil quantity
+            text_lower = text.lower()
             quantity = "1"
-            if "engine oil" in text.lower() or "fill in" in text.lower():
+            if "engine oil" in text_lower or "fill in" in text_lower:
                 if oil_capacity:
                     quantity = str(oil_capacity)
 
@@ -434,7 +487,7 @@ def match_parts_to_services(classified_data: Dict, pet_data: List[Dict],
                         "PART NUMBER": match.get('part_number', 'NOT FOUND'),
                         "DESCRIPTION": match.get('description', ''),
                         "REMARK": match.get('remark', ''),
-                        "QUANTITY": quantity if "oil" in text.lower() and not is_addon else match.get('quantity', '1'),
+                        "QUANTITY": quantity if "oil" in text_lower and not is_addon else match.get('quantity', '1'),
                         "MATCH SCORE": round(match.get('score', 0), 3)
                     })
 
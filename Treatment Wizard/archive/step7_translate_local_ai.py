@@ -10,12 +10,21 @@ Fixes included:
 - Preserves placeholders correctly
 """
 
-import json
+import orjson
+import os
 import re
+import hashlib
+import sqlite3
+import threading
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import subprocess
 import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
 
 
 # =========================
@@ -35,8 +44,25 @@ KEY_TRANSLATIONS = {
     'QUANTITY': 'כמות'
 }
 
+# Keys whose values are codes/identifiers and are never translated (compared uppercase)
+NON_TRANSLATABLE_KEYS = {
+    'PART NUMBER', 'SKU', 'UPC', 'EAN', 'MPN', 'BARCODE', 'URL', 'EMAIL', 'ID', 'MODEL'
+}
+
+# Closed-vocabulary values translated without the model (lowercase keys)
+STATIC_GLOSSARY = {
+    'not found': 'לא נמצא',
+    'yes': 'כן',
+    'no': 'לא',
+    'each': 'יחידה',
+    'pair': 'זוג',
+    'set': 'סט',
+    'box': 'קופסה',
+    'none': 'אין',
+}
+
 # Patterns to preserve exactly
-PRESERVE_PATTERNS = [
+_RAW_PRESERVE_PATTERNS = [
     r'Porsche',
     r'Exxon Mobil',
     r'Mobil 1',
@@ -48,69 +74,127 @@ PRESERVE_PATTERNS = [
     r'\d+\.\d+\s*Ltr\.?',
     r'Page:\s*\d+',
 ]
+# All preserve patterns as one alternation (group p<i> = pattern i) for a single substitution pass
+_RE_PRESERVE = re.compile("|".join(f"(?P<p{i}>{p})" for i, p in enumerate(_RAW_PRESERVE_PATTERNS)),
+                          re.IGNORECASE)
+
+# Ollama REST API - one keep-alive session for all translation requests
+OLLAMA_URL = "http://localhost:11434/api/generate"
+# Deterministic translations (the default aya-expanse tag is already a Q4_K_M quantized build)
+OLLAMA_OPTIONS = {"temperature": 0}
+# Context per request: prompt + answer budget must fit, or Ollama silently shifts the rules out.
+# Batches are sized to fit OLLAMA_NUM_CTX; only an oversized request gets a larger window
+# (which makes Ollama reload the model, so it is kept for the rare single long text).
+OLLAMA_NUM_CTX = 4096
+PROMPT_CHARS = 320                     # rules part of a batch prompt (characters)
+NUM_PREDICT_PER_TEXT = 128             # output token cap per translated string (short texts)
+LENGTH_BUCKETS = (20, 80, 300)         # batch boundaries by text length (chars)
+OLLAMA_KEEP_ALIVE = -1                # keep the model loaded between requests
+# Concurrent requests - read from the same variable that sets the server's parallel slots.
+# Unset = one request at a time; extra in-flight requests would only queue on the server
+# and spend their read timeout waiting.
+OLLAMA_NUM_PARALLEL = max(1, int(os.environ.get("OLLAMA_NUM_PARALLEL") or 1))
+TRANSLATION_BATCH_SIZE = 16          # strings per prompt in translate_batch
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_NUM_PARALLEL))
+# Shared worker pool for translation requests (threads start lazily, on first use)
+_EXECUTOR = ThreadPoolExecutor(max_workers=OLLAMA_NUM_PARALLEL)
+
+# Translation memory: hash(prompt version, model, normalized text) -> translation.
+# In-memory dict in front of an SQLite table that persists between runs.
+TRANSLATION_DB_FILE = Path("translations.sqlite")
+# Bump on any change to the translation prompts - old entries then stop matching
+TRANSLATION_PROMPT_VERSION = 1
+_TRANSLATION_CACHE: Dict[bytes, str] = {}
+_TRANSLATION_DB: Optional[sqlite3.Connection] = None
+_PENDING_WRITES: List[Tuple[bytes, str]] = []
+_DB_LOCK = threading.Lock()
+
+# Text cleanup / parsing regexes (compiled once)
+_RE_LATIN_PAREN = re.compile(r'\([^)]*[A-Za-z][^)]*\)')
+_RE_EMPTY_PAREN = re.compile(r'\(\s*\)')
+_RE_PLACEHOLDER_OR_LATIN = re.compile(r'__PRESERVE_\d+_\d+__|[A-Za-z]+')
+_RE_HEBREW = re.compile(r'[\u0590-\u05FF]')
+_RE_NO_LETTERS = re.compile(r'[\W\d_]+')
+_RE_WHITESPACE = re.compile(r'\s+')
+_RE_NUMBER_UNIT_GAP = re.compile(r'(?<=\d) (?=[^\W\d_])|(?<=[^\W\d_]) (?=\d)')
+_RE_NUMBERED_LINE = re.compile(r'^\s*(\d+)[.)]\s*(.*)$')
 
 
 # =========================
 # Helper Functions
 # =========================
 
-def run_ollama_safe(args, prompt, timeout=120):
-    """
-    Runs Ollama safely on Windows by reading raw bytes and decoding manually.
+def run_ollama_safe(model, prompt, timeout=120, num_predict=NUM_PREDICT_PER_TEXT):
     """
-    proc = subprocess.Popen(
-        args,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        shell=False
-    )
+    Runs a prompt through the Ollama HTTP API over the shared keep-alive session
+    (no process spawn per request). JSON responses avoid Windows console encoding issues.
 
+    Returns:
+        (response text, "") on success, (None, error) on failure or "TIMEOUT"
+    """
     try:
-        out, err = proc.communicate(prompt.encode('utf-8'), timeout=timeout)
-    except subprocess.TimeoutExpired:
-        proc.kill()
+        response = _SESSION.post(
+            OLLAMA_URL,
+            json={
+                "model": model,
+                "prompt": prompt,
+                "stream": False,
+                "options": {**OLLAMA_OPTIONS, "num_predict": num_predict,
+                            "num_ctx": _context_size(len(prompt), num_predict)},
+                "keep_alive": OLLAMA_KEEP_ALIVE
+            },
+            timeout=timeout
+        )
+    except requests.exceptions.Timeout:
         return None, "TIMEOUT"
+    except requests.exceptions.RequestException as e:
+        return None, str(e)
 
-    # Decode manually to UTF-8, ignore bad bytes
-    out_decoded = out.decode("utf-8", errors="ignore")
-    err_decoded = err.decode("utf-8", errors="ignore")
+    if response.status_code != 200:
+        return None, response.text
 
-    return out_decoded, err_decoded
+    return orjson.loads(response.content).get("response", ""), ""
 
 
-def clean_latin(text: str) -> str:
+def _context_size(prompt_chars: int, num_predict: int) -> int:
     """
-    Remove any English letters or mixed Latin added by the model.
-    Ensures output is pure Hebrew + numbers + placeholders.
+    Context window for a request: prompt (one token per character - an upper bound)
+    plus the answer budget, at least OLLAMA_NUM_CTX and rounded up to 1024.
     """
-    # Allow placeholders like __PRESERVE_0_1__
-    placeholder_pattern = r'__PRESERVE_\d+_\d+__'
-
-    # Temporarily protect placeholders
-    preserved = re.findall(placeholder_pattern, text)
-    for i, ph in enumerate(preserved):
-        text = text.replace(ph, f"__TEMP_PH_{i}__")
+    needed = prompt_chars + num_predict
+    return max(OLLAMA_NUM_CTX, -(-needed // 1024) * 1024)
 
-    # Remove Latin characters a-zA-Z inside parentheses or outside
-    text = re.sub(r'\([^)]*[A-Za-z][^)]*\)', '', text)
-    text = re.sub(r'[A-Za-z]', '', text)
 
-    # Clean leftover empty parentheses
-    text = re.sub(r'\(\s*\)', '', text)
+def warm_up_model(model: str) -> bool:
+    """
+    Loads the model into memory ahead of the first translation
+    (a generate request without a prompt only loads the model).
+    Loaded with the same context size the translation requests use,
+    otherwise the first real request would make Ollama reload it.
+    """
+    try:
+        response = _SESSION.post(
+            OLLAMA_URL,
+            json={"model": model, "keep_alive": OLLAMA_KEEP_ALIVE,
+                  "options": {**OLLAMA_OPTIONS, "num_ctx": OLLAMA_NUM_CTX}},
+            timeout=300
+        )
+        return response.status_code == 200
+    except requests.exceptions.RequestException:
+        return False
 
-    # Restore placeholders
-    for i, ph in enumerate(preserved):
-        text = text.replace(f"__TEMP_PH_{i}__", ph)
 
-    return text.strip()
+@lru_cache(maxsize=1)
+def _ollama_list():
+    """Runs 'ollama list' once per process (shared by the startup checks)."""
+    return subprocess.run(['ollama', 'list'], capture_output=True, text=True, timeout=15)
 
 
 def check_ollama_running() -> bool:
     """Check if Ollama is running."""
     try:
-        result = subprocess.run(['ollama', 'list'], capture_output=True, text=True, timeout=15)
-        return result.returncode == 0
+        return _ollama_list().returncode == 0
     except:
         return False
 
@@ -118,33 +202,147 @@ def check_ollama_running() -> bool:
 def check_model_exists(model: str) -> bool:
     """Check if model is installed."""
     try:
-        result = subprocess.run(['ollama', 'list'], capture_output=True, text=True)
-        return model in result.stdout
+        return model in _ollama_list().stdout
     except:
         return False
 
 
+def open_translation_cache(path: Path = TRANSLATION_DB_FILE) -> int:
+    """Opens the on-disk translation memory (SQLite). Returns number of stored entries."""
+    global _TRANSLATION_DB
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS t(h BLOB PRIMARY KEY, out TEXT)")
+    _TRANSLATION_DB = conn
+    return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+
+def flush_translation_cache() -> int:
+    """Writes new translations to disk in a single transaction. Returns rows written."""
+    if _TRANSLATION_DB is None:
+        return 0
+    with _DB_LOCK:
+        rows = list(_PENDING_WRITES)
+        _PENDING_WRITES.clear()
+        with _TRANSLATION_DB:
+            _TRANSLATION_DB.executemany("INSERT OR IGNORE INTO t VALUES (?, ?)", rows)
+    return len(rows)
+
+
+def close_translation_cache() -> None:
+    """Flushes and closes the on-disk translation memory."""
+    global _TRANSLATION_DB
+    if _TRANSLATION_DB is None:
+        return
+    flush_translation_cache()
+    _TRANSLATION_DB.close()
+    _TRANSLATION_DB = None
+
+
+def _normalize_for_cache(text: str) -> str:
+    """
+    Cache-lookup form of a text: case, whitespace runs, surrounding punctuation and
+    number/unit spacing are ignored ("12V Battery." and "12 v  battery" share an entry).
+    """
+    normalized = _RE_WHITESPACE.sub(' ', text.casefold()).strip(' .,;:')
+    return _RE_NUMBER_UNIT_GAP.sub('', normalized)
+
+
+def _cache_key(text: str, model: str) -> bytes:
+    normalized = f"{TRANSLATION_PROMPT_VERSION}|{model}|{_normalize_for_cache(text)}"
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+def _cache_get(key: bytes) -> Optional[str]:
+    cached = _TRANSLATION_CACHE.get(key)
+    if cached is None and _TRANSLATION_DB is not None:
+        with _DB_LOCK:
+            row = _TRANSLATION_DB.execute("SELECT out FROM t WHERE h=?", (key,)).fetchone()
+        if row is not None:
+            cached = _TRANSLATION_CACHE[key] = row[0]
+    return cached
+
+
+def _cache_put(key: bytes, translation: str) -> None:
+    # An answer stripped to nothing is a failed translation - retry it next time
+    if not translation.strip():
+        return
+    _TRANSLATION_CACHE[key] = translation
+    if _TRANSLATION_DB is not None:
+        with _DB_LOCK:
+            _PENDING_WRITES.append((key, translation))
+
+
 # =========================
 # Translation Core
 # =========================
 
-def translate_with_ollama(text: str, model: str = "aya-expanse") -> str:
+def _prepare_text(text: str):
+    """
+    Pre-translation step shared by single and batch translation.
+
+    Returns:
+        (result, None, None) when no model call is needed,
+        (None, text with placeholders, preserved items) otherwise
+    """
     if not text or text.strip() == "":
-        return text
+        return text, None, None
 
-    if any('\u0590' <= c <= '\u05FF' for c in text):
-        return text
+    if _RE_HEBREW.search(text):
+        return text, None, None
+
+    # Numbers, punctuation and single characters (quantities, capacities) stay as they are
+    if _RE_NO_LETTERS.fullmatch(text) or len(text.strip()) <= 1:
+        return text, None, None
 
-    if text.strip().upper() == "NOT FOUND":
-        return "לא נמצא"
+    glossary = STATIC_GLOSSARY.get(text.strip().lower())
+    if glossary is not None:
+        return glossary, None, None
 
     preserved = {}
-    temp = text
-    for i, pattern in enumerate(PRESERVE_PATTERNS):
-        for match in re.finditer(pattern, temp, re.IGNORECASE):
-            ph = f"__PRESERVE_{i}_{len(preserved)}__"
-            preserved[ph] = match.group()
-            temp = temp.replace(match.group(), ph, 1)
+
+    def protect(match):
+        ph = f"__PRESERVE_{match.lastgroup[1:]}_{len(preserved)}__"
+        preserved[ph] = match.group()
+        return ph
+
+    temp = _RE_PRESERVE.sub(protect, text)
+
+    return None, temp, preserved
+
+
+def _finish_text(output: str, preserved: Dict[str, str]) -> str:
+    """
+    Restores preserved items and strips Latin from a model output in one pass
+    (Latin in parentheses, then any other Latin run; the restored preserved terms are kept).
+    """
+    # Remove parentheses with Latin inside (model transliterations)
+    output = _RE_LATIN_PAREN.sub('', output)
+
+    # Placeholders → original text, any other Latin run → removed
+    output = _RE_PLACEHOLDER_OR_LATIN.sub(lambda m: preserved.get(m.group(), ''), output)
+
+    # Clean leftover empty parentheses
+    output = _RE_EMPTY_PAREN.sub('', output)
+
+    return output.strip()
+
+
+def _predict_budget(text: str) -> int:
+    """Output token cap for one translated line (long descriptions get more room)."""
+    return max(NUM_PREDICT_PER_TEXT, len(text))
+
+
+def translate_with_ollama(text: str, model: str = "aya-expanse") -> str:
+    result, temp, preserved = _prepare_text(text)
+    if temp is None:
+        return result
+
+    key = _cache_key(text, model)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
 
     prompt = f"""
 Translate to Hebrew:
@@ -162,57 +360,188 @@ Text:
 Hebrew only:
 """.strip()
 
-    try:
-        result = subprocess.run(
-            ["ollama", "run", model],
-            input=prompt,
-            capture_output=True,
-            timeout=90,
-            text=True,                   # decode automatically
-            encoding="utf-8",            # force utf-8
-            errors="ignore"              # ignore bad bytes
-        )
+    output, err = run_ollama_safe(model, prompt, timeout=90, num_predict=_predict_budget(temp))
+
+    if output is None:
+        if err == "TIMEOUT":
+            print("⚠️ Timeout translating:", text[:40])
+        else:
+            print("⚠️ Ollama returned error:", err)
+        return text
 
-        if result.returncode != 0:
-            print("⚠️ Ollama returned error:", result.stderr)
-            return text
+    output = _finish_text(output, preserved)
+    _cache_put(key, output)
+    return output
 
-        output = result.stdout.strip()
 
-        # Restore preserved items
-        for ph, original in preserved.items():
-            output = output.replace(ph, original)
+def translate_batch(texts: List[str], model: str = "aya-expanse") -> List[str]:
+    """
+    Translates several strings with one prompt (numbered lines in, numbered lines out),
+    so the rules prefix is processed once per batch instead of once per string.
+    Falls back to per-string calls if the answer can't be parsed back into the same lines.
+    """
+    results = list(texts)
+    pending = []  # (index, text with placeholders, preserved)
+    for i, text in enumerate(texts):
+        result, temp, preserved = _prepare_text(text)
+        if temp is None:
+            results[i] = result
+            continue
+
+        cached = _cache_get(_cache_key(text, model))
+        if cached is not None:
+            results[i] = cached
+        elif '\n' in temp:
+            # Multi-line text breaks the one-line-per-item protocol
+            results[i] = translate_with_ollama(text, model)
+        else:
+            pending.append((i, temp, preserved))
 
-        # Remove any English
-        output = clean_latin(output)
+    if len(pending) == 1:
+        results[pending[0][0]] = translate_with_ollama(texts[pending[0][0]], model)
+        return results
+    if not pending:
+        return results
 
-        return output
+    longest = max((temp for _, temp, _ in pending), key=len)
+    numbered = "\n".join(f"{n}. {temp}" for n, (_, temp, _) in enumerate(pending, 1))
+    prompt = f"""
+Translate each numbered line to Hebrew:
 
-    except subprocess.TimeoutExpired:
-        print("⚠️ Timeout translating:", text[:40])
-        return text
+Rules:
+- Only pure Hebrew words.
+- No transliteration.
+- No English.
+- No parentheses unless in source.
+- Keep placeholders unchanged.
+- Answer with the same numbered lines, one line per number.
+
+Text:
+{numbered}
+
+Hebrew only:
+""".strip()
+
+    output, err = run_ollama_safe(model, prompt, timeout=90 + 15 * len(pending),
+                                  num_predict=_predict_budget(longest) * len(pending))
+
+    lines = {}
+    if output is not None:
+        for line in output.splitlines():
+            match = _RE_NUMBERED_LINE.match(line)
+            if match:
+                lines[int(match.group(1))] = match.group(2)
+
+    if set(lines) != set(range(1, len(pending) + 1)):
+        # Unparseable answer (or request failure) - translate one by one
+        for i, _, _ in pending:
+            results[i] = translate_with_ollama(texts[i], model)
+        return results
+
+    for n, (i, _, preserved) in enumerate(pending, 1):
+        results[i] = _finish_text(lines[n], preserved)
+        _cache_put(_cache_key(texts[i], model), results[i])
+
+    return results
 
 
 # =========================
 # Recursive translation
 # =========================
 
-def translate_value(value: Any, key: str, model="aya-expanse") -> Any:
+def is_translatable_key(key: Optional[str]) -> bool:
+    return key is None or key.upper() not in NON_TRANSLATABLE_KEYS
+
+
+def collect_texts(value: Any, key: Optional[str], texts: Dict[str, None]) -> None:
+    """
+    Collects every string translate_value would translate (unique, in tree order).
+    """
     if isinstance(value, str):
-        if key == "PART NUMBER":
+        if is_translatable_key(key):
+            texts[value] = None
+    elif isinstance(value, list):
+        for v in value:
+            collect_texts(v, key, texts)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            collect_texts(v, k, texts)
+
+
+def _chunk_bucket(bucket: List[str]) -> List[List[str]]:
+    """
+    Splits a length bucket into batches of up to TRANSLATION_BATCH_SIZE strings
+    whose prompt and answer budget (as translate_batch requests it) fit OLLAMA_NUM_CTX.
+    """
+    chunks = []
+    chunk, chars, budget = [], PROMPT_CHARS, 0
+    for text in bucket:
+        # Measured on the text as sent (placeholders are longer than the terms they hide);
+        # "N. text" line + the longest line's budget for every line in the batch
+        temp = _prepare_text(text)[1] or ""
+        line_chars = len(temp) + 5
+        line_budget = max(budget, _predict_budget(temp))
+        if chunk and (len(chunk) == TRANSLATION_BATCH_SIZE or
+                      chars + line_chars + line_budget * (len(chunk) + 1) > OLLAMA_NUM_CTX):
+            chunks.append(chunk)
+            chunk, chars, line_budget = [], PROMPT_CHARS, _predict_budget(temp)
+        chunk.append(text)
+        chars += line_chars
+        budget = line_budget
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def translate_many(texts: List[str], model="aya-expanse") -> Dict[str, str]:
+    """
+    Translates independent strings concurrently (I/O bound on the Ollama server),
+    up to TRANSLATION_BATCH_SIZE strings per prompt (fewer for long strings, so a
+    prompt and its answer fit the context window). Returns {original: translation}.
+    Strings are batched with others of similar length (LENGTH_BUCKETS), so one long
+    description doesn't set the output budget of a batch of short names.
+    Longest bucket is dispatched first so short batches fill the tail of the run.
+    """
+    buckets = {}
+    for text in texts:
+        buckets.setdefault(bisect_right(LENGTH_BUCKETS, len(text)), []).append(text)
+
+    chunks = [chunk
+              for _, bucket in sorted(buckets.items(), reverse=True)
+              for chunk in _chunk_bucket(bucket)]
+
+    translations = {}
+    for chunk, translated in zip(chunks, _EXECUTOR.map(lambda c: translate_batch(c, model), chunks)):
+        translations.update(zip(chunk, translated))
+    return translations
+
+
+def translate_value(value: Any, key: str, model="aya-expanse",
+                    translations: Optional[Dict[str, str]] = None) -> Any:
+    if isinstance(value, str):
+        if not is_translatable_key(key):
             return value
+        if translations is not None:
+            return translations[value]
         return translate_with_ollama(value, model)
 
     if isinstance(value, list):
-        return [translate_value(v, key, model) for v in value]
+        return [translate_value(v, key, model, translations) for v in value]
 
     if isinstance(value, dict):
-        return translate_dict(value, model)
+        return translate_dict(value, model, translations)
 
     return value
 
 
-def translate_dict(data: Dict, model="aya-expanse") -> Dict:
+def translate_dict(data: Dict, model="aya-expanse",
+                   translations: Optional[Dict[str, str]] = None) -> Dict:
+    # Top level: translate all strings of the tree up front, concurrently and once per unique text
+    if translations is None:
+        texts = {}
+        collect_texts(data, None, texts)
+        translations = translate_many(list(texts), model)
+
     result = {}
     for key, value in data.items():
 
@@ -221,9 +550,9 @@ def translate_dict(data: Dict, model="aya-expanse") -> Dict:
 
         # Special case for parts list
         if key == "matched_parts" and isinstance(value, list):
-            result[heb_key] = [translate_dict(p, model) for p in value]
+            result[heb_key] = [translate_dict(p, model, translations) for p in value]
         else:
-            result[heb_key] = translate_value(value, key, model)
+            result[heb_key] = translate_value(value, key, model, translations)
 
     return result
 
@@ -249,17 +578,27 @@ def translate_service_baskets(input_file: Path, output_file: Path, model="aya-ex
         print(f"❌ Missing file: {input_file}")
         return False
 
+    # Load the model in the background while the input is read and the cache opened
+    _EXECUTOR.submit(warm_up_model, model)
+
     print(f"📄 Loading {input_file} ...")
-    data = json.load(open(input_file, encoding="utf-8"))
+    data = orjson.loads(input_file.read_bytes())
     print(f"🔍 Found {len(data)} top-level keys")
 
+    cached = open_translation_cache()
+    if cached:
+        print(f"🧠 {cached} cached translations available")
+
     print("🔄 Translating...")
     start = time.time()
-    translated = translate_dict(data, model)
+    try:
+        translated = translate_dict(data, model)
+    finally:
+        close_translation_cache()
     print(f"⏳ Finished in {time.time() - start:.1f}s")
 
     print(f"💾 Saving → {output_file}")
-    json.dump(translated, open(output_file, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
+    output_file.write_bytes(orjson.dumps(translated, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
 
     print("✅ Done!")
     return True
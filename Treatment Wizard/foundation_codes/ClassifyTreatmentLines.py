@@ -1,11 +1,109 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import orjson
+import mmap
 import os
+import re
 import glob
+import hashlib
+import sqlite3
 from datetime import datetime
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
+# מספר בקשות מקבילות ל-Ollama - כדאי שיתאים ל-OLLAMA_NUM_PARALLEL בצד השרת
+# (ולהגדיר גם OLLAMA_MAX_LOADED_MODELS=1 כדי שהמודל יישאר טעון)
+OLLAMA_NUM_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", "8"))
+
+# חיבור keep-alive אחד לכל הקריאות ל-Ollama במקום חיבור TCP חדש לכל בקשה
+_SESSION = requests.Session()
+_SESSION.mount('http://', HTTPAdapter(pool_connections=32, pool_maxsize=32))
+
+# גודל אצווה לסיווג - כמה שורות נארזות בפרומפט אחד
+# (מעבר ל-16 הדיוק של llama3.2 יורד)
+CLASSIFY_BATCH_SIZE = 16
+
+PROMPT_HEADER = """Task: Classify the following car-service line into one of two categories:
+- PARTS → The line requires adding, replacing, filling, changing, renewing, installing, or topping up any physical part or fluid.
+- INSPECTION → The line describes checking, inspecting, reading, resetting, measuring, diagnosing, cleaning, verifying, visually inspecting, or any administrative or functional check."""
+
+CLASSIFICATION_RULES = """Classification Rules (strict and deterministic):
+
+PARTS category keywords (always classify as PARTS if any appear):
+"replace", "change", "fill", "refill", "add", "install", "renew", 
+"top up", "replenish", "replace filter", "replace element", "replace fluid",
+"replace spark", "oil change", "fluid change".
+
+INSPECTION category keywords (always classify as INSPECTION if ONLY these appear):
+"check", "inspect", "inspection", "visual inspection",
+"read", "reset", "diagnose", "diagnostic", "verify",
+"measure", "look", "test", "drain", "prepare report",
+"check function", "check condition", "check level",
+"read out memory", "reset maintenance interval".
+
+Special rules:
+- "Drain" WITHOUT "replace/change/fill/add" = INSPECTION.
+- ANY mention of a filter replacement = PARTS.
+- ANY addition/refill/change of a liquid/oil/fluid = PARTS.
+- ANY combination of both (e.g. “check and replace”) = PARTS always wins.
+- Administrative actions (prepare report, reset, read memory) = INSPECTION.
+- When the meaning is ambiguous → classify as INSPECTION."""
+
+# ההוראות הקבועות נשלחות כ-system prompt - זהות בכל בקשה, כך ש-Ollama
+# ממחזר את ה-KV cache של הקידומת ומעבד מחדש רק את שורת השירות
+SYSTEM_PROMPT = f"""{PROMPT_HEADER}
+
+{CLASSIFICATION_RULES}"""
+
+# הפרומפט לשורה בודדת: קידומת + שורה + סיומת (בלי f-string לכל קריאה)
+ITEM_PROMPT_PREFIX = 'Service item: "'
+ITEM_PROMPT_SUFFIX = """"
+
+Output format:
+Respond with ONE WORD ONLY:
+- "YES" → if the line is PARTS
+- "NO" → if the line is INSPECTION
+Do NOT add explanations, reasoning, or extra text.
+"""
+
+# גוף הבקשה המשותף ל-Ollama - כל קריאה משלימה רק prompt/format/options
+_BASE_BODY = {
+    "model": "llama3.2",
+    "stream": False,
+    "system": SYSTEM_PROMPT
+}
+_ITEM_OPTIONS = {
+    "temperature": 0.0,
+    # מרווח לתשובת ה-JSON ("YES" עם מרכאות ורווחים) - הייצור נעצר בסוף ה-schema
+    "num_predict": 16,
+    "top_k": 1,
+    "stop": ["\n"]
+}
+
+# תשובת המודל מוגבלת ב-JSON schema למילה אחת - הייצור נעצר מיד אחריה
+ANSWER_SCHEMA = {"type": "string", "enum": ["YES", "NO"]}
+
+# מילות המפתח מהכללים בפרומפט - שורה שמכילה אותן מסווגת בלי LLM
+# PARTS לפי שורש המילה (replacement, changing, renewal, filling, topping up...)
+PARTS_RE = re.compile(
+    r"\b(replac\w*|chang\w*|renew\w*|refill\w*|fill(?:s|ed|ing)?|top(?:ping)?\s*up|"
+    r"install\w*|replenish\w*|add(?:s|ed|ing)?)\b", re.I
+)
+INSP_RE = re.compile(
+    r"\b(check|inspect|read|reset|diagnose|verify|measure|test|drain|prepare\s+report)\b", re.I
+)
+
+# ניקוי שמות וריאנטים לשמות תיקיות/קבצים
+_INVALID_NAME_CHARS_RE = re.compile(r"[^\w /]")
+_NAME_SEPARATORS_RE = re.compile(r"[ /_]+")
+
+# מטמון סיווגים בין ריצות - יש להעלות את PROMPT_VERSION בכל שינוי בפרומפט
+CACHE_PATH = os.path.join("Classification Results", ".cache.sqlite")
+PROMPT_VERSION = 4
+
+_cache_connection = None
+
 
 def normalize_model_name(model_name):
     """
@@ -21,24 +119,15 @@ def sanitize_variant_name(variant_name):
     נקה את שם הוריאנט כדי ליצור שם קובץ תקני
     הסר slashes, spaces, underscores כפולים
     """
-    # החלף את כל הslashes ו-spaces בunderscore
-    safe_name = variant_name.replace(' / ', '_').replace('/', '_').replace(' ', '_')
-
-    # הסר תווים שאינם alphanumeric או underscore (כולל hyphen)
-    safe_name = "".join(c for c in safe_name if c.isalnum() or c == '_')
+    # הסר תווים שאינם alphanumeric, underscore, slash או רווח (כולל hyphen)
+    safe_name = _INVALID_NAME_CHARS_RE.sub('', variant_name)
 
-    # הסר underscores כפולים/משולשים וכו'
-    while '__' in safe_name:
-        safe_name = safe_name.replace('__', '_')
-
-    # הסר underscores בהתחלה או בסוף
-    safe_name = safe_name.strip('_')
+    # החלף כל רצף של slashes / spaces / underscores ב-underscore אחד
+    # והסר underscores בהתחלה או בסוף
+    safe_name = _NAME_SEPARATORS_RE.sub('_', safe_name).strip('_')
 
     # אם השם ריק, תן שם ברירת מחדל
-    if not safe_name:
-        safe_name = "model_variant"
-
-    return safe_name
+    return safe_name or "model_variant"
 
 
 def classify_with_ollama(item, num_runs=1):
@@ -87,68 +176,60 @@ def classify_with_ollama(item, num_runs=1):
 # No explanation. No additional text. Only YES or NO.
 # """
 
-    prompt = f"""Task: Classify the following car-service line into one of two categories:
-- PARTS → The line requires adding, replacing, filling, changing, renewing, installing, or topping up any physical part or fluid.
-- INSPECTION → The line describes checking, inspecting, reading, resetting, measuring, diagnosing, cleaning, verifying, visually inspecting, or any administrative or functional check.
-
-Service item: "{item}"
-
-Classification Rules (strict and deterministic):
-
-PARTS category keywords (always classify as PARTS if any appear):
-"replace", "change", "fill", "refill", "add", "install", "renew", 
-"top up", "replenish", "replace filter", "replace element", "replace fluid",
-"replace spark", "oil change", "fluid change".
-
-INSPECTION category keywords (always classify as INSPECTION if ONLY these appear):
-"check", "inspect", "inspection", "visual inspection",
-"read", "reset", "diagnose", "diagnostic", "verify",
-"measure", "look", "test", "drain", "prepare report",
-"check function", "check condition", "check level",
-"read out memory", "reset maintenance interval".
-
-Special rules:
-- "Drain" WITHOUT "replace/change/fill/add" = INSPECTION.
-- ANY mention of a filter replacement = PARTS.
-- ANY addition/refill/change of a liquid/oil/fluid = PARTS.
-- ANY combination of both (e.g. “check and replace”) = PARTS always wins.
-- Administrative actions (prepare report, reset, read memory) = INSPECTION.
-- When the meaning is ambiguous → classify as INSPECTION.
-
-Output format:
-Respond with ONE WORD ONLY:
-- "YES" → if the line is PARTS
-- "NO" → if the line is INSPECTION
-Do NOT add explanations, reasoning, or extra text.
-"""
+    body = _BASE_BODY | {
+        "prompt": ITEM_PROMPT_PREFIX + item + ITEM_PROMPT_SUFFIX,
+        "format": ANSWER_SCHEMA,
+        "options": _ITEM_OPTIONS
+    }
     results = []
 
     for run in range(num_runs):
         try:
-            response = requests.post(
+            response = _SESSION.post(
                 'http://localhost:11434/api/generate',
-                json={
-                    "model": "llama3.2",
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {"temperature": 0.3}
-                },
+                json=body,
                 timeout=120
             )
 
             if response.status_code == 200:
-                answer = response.json()['response'].strip().upper()
-                if 'YES' in answer:
-                    results.append('YES')
-                elif 'NO' in answer:
-                    results.append('NO')
-                else:
-                    results.append('UNCLEAR')
+                answer = json.loads(response.json()['response'])
+                results.append(answer if answer in ('YES', 'NO') else 'UNCLEAR')
         except Exception as e:
             print(f"Error on run {run + 1}: {e}")
             results.append('ERROR')
 
-    # Calculate confidence
+    return votes_to_classification(results)
+
+
+def rule_classify(item):
+    """
+    סיווג דטרמיניסטי לפי מילות המפתח של הפרומפט
+    PARTS גובר כשמופיעים שני הסוגים; None אם אין מילת מפתח
+
+    >>> rule_classify("Check V-belt, replacement if necessary")
+    ('PARTS', 100)
+    >>> rule_classify("Brake fluid: changing")
+    ('PARTS', 100)
+    >>> rule_classify("Inspect coolant level, topping up if required")
+    ('PARTS', 100)
+    >>> rule_classify("Check tyre pressure, filling if necessary")
+    ('PARTS', 100)
+    >>> rule_classify("Spark plugs: renewal")
+    ('PARTS', 100)
+    >>> rule_classify("Check brake pads")
+    ('INSPECTION', 100)
+    """
+    if PARTS_RE.search(item):
+        return 'PARTS', 100
+    if INSP_RE.search(item):
+        return 'INSPECTION', 100
+    return None
+
+
+def votes_to_classification(results):
+    """
+    Calculate category and consistency-based confidence from YES/NO votes
+    """
     yes_count = results.count('YES')
     no_count = results.count('NO')
     total_valid = yes_count + no_count
@@ -164,20 +245,135 @@ Do NOT add explanations, reasoning, or extra text.
         return 'INSPECTION', confidence
 
 
-def deduplicate_items(all_json_data):
+def classify_batch(items, num_runs=1):
+    """
+    Classify several items in a single Ollama prompt.
+    Items are numbered [1]..[b] and the model answers a JSON object
+    {"1": "YES", "2": "NO", ...} constrained by a schema; the rules
+    travel in the shared system prompt.
+    Items the model skipped are classified one by one.
+    """
+    numbered_items = "".join(f"[{i}] {item}\n" for i, item in enumerate(items, 1))
+
+    prompt = f"""Service items:
+{numbered_items}
+Output format:
+Respond with a JSON object that maps every item number (1 to {len(items)}) to:
+- "YES" → if the line is PARTS
+- "NO" → if the line is INSPECTION
+Do NOT add explanations, reasoning, or extra text.
+"""
+    keys = [str(i) for i in range(1, len(items) + 1)]
+    batch_schema = {
+        "type": "object",
+        "properties": {key: ANSWER_SCHEMA for key in keys},
+        "required": keys
+    }
+    body = _BASE_BODY | {
+        "prompt": prompt,
+        "format": batch_schema,
+        "options": {
+            "temperature": 0.0,
+            "num_predict": 12 * len(items) + 16,
+            "top_k": 1
+        }
+    }
+    votes = [[] for _ in items]
+
+    for run in range(num_runs):
+        try:
+            response = _SESSION.post(
+                'http://localhost:11434/api/generate',
+                json=body,
+                timeout=120
+            )
+
+            if response.status_code == 200:
+                answers = json.loads(response.json()['response'])
+                for idx, key in enumerate(keys):
+                    if answers.get(key) in ('YES', 'NO'):
+                        votes[idx].append(answers[key])
+        except Exception as e:
+            print(f"Error on batch run {run + 1}: {e}")
+
+    results = []
+    for item, item_votes in zip(items, votes):
+        if item_votes:
+            results.append(votes_to_classification(item_votes))
+        else:
+            results.append(classify_with_ollama(item, num_runs=num_runs))
+
+    return results
+
+
+def _get_cache_connection():
+    """
+    פתח (פעם אחת) את מסד המטמון וצור את הטבלה אם צריך
+    """
+    global _cache_connection
+
+    if _cache_connection is None:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        _cache_connection = sqlite3.connect(CACHE_PATH)
+        _cache_connection.execute(
+            "CREATE TABLE IF NOT EXISTS classifications ("
+            "item_hash TEXT PRIMARY KEY, category TEXT, "
+            "confidence INTEGER, prompt_version INTEGER)"
+        )
+
+    return _cache_connection
+
+
+def _cache_key(item):
+    return hashlib.sha1(item.encode('utf-8')).hexdigest()
+
+
+def _cache_get(item):
+    """
+    החזר (category, confidence) מהמטמון או None
+    """
+    row = _get_cache_connection().execute(
+        "SELECT category, confidence FROM classifications "
+        "WHERE item_hash = ? AND prompt_version = ?",
+        (_cache_key(item), PROMPT_VERSION)
+    ).fetchone()
+
+    return tuple(row) if row else None
+
+
+def _cache_set(item, category, confidence):
+    _get_cache_connection().execute(
+        "INSERT OR REPLACE INTO classifications "
+        "(item_hash, category, confidence, prompt_version) VALUES (?, ?, ?, ?)",
+        (_cache_key(item), category, confidence, PROMPT_VERSION)
+    )
+
+
+def chunked(items, size):
+    """
+    חלק רשימה לאצוות בגודל קבוע
+    """
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def deduplicate_items(all_json_files):
     """
     אסוף את כל הפריטים מכל ה-JSONs,
     הסר כפילויות והחזר רשימה של פריטים ייחודיים
+
+    באותו מעבר מקבץ גם את וריאנטי הדגמים של כל קובץ (json_file_info['variants']),
+    כך ש-process_json_file לא צריך לעבור שוב על ה-JSON המקורי
     """
     unique_items = set()
+    add = unique_items.add
 
-    for json_file_data in all_json_data:
-        for service_key, models_dict in json_file_data.items():
-            if isinstance(models_dict, dict):
-                for model_name, items_list in models_dict.items():
-                    if isinstance(items_list, list):
-                        for item in items_list:
-                            unique_items.add(item)
+    for json_file_info in all_json_files:
+        model_variants = {}
+        for variant_name, service_key, item in iter_variant_items(json_file_info['data']):
+            services_dict = model_variants.setdefault(variant_name, {})
+            services_dict.setdefault(service_key, []).append(item)
+            add(item)
+        json_file_info['variants'] = model_variants
 
     return list(unique_items)
 
@@ -193,13 +389,52 @@ def classify_unique_items(unique_items):
     print(f"CLASSIFYING {len(unique_items)} UNIQUE ITEMS")
     print(f"{'=' * 80}\n")
 
-    for item in tqdm(unique_items, desc="Classifying items", unit="item"):
-        category, confidence = classify_with_ollama(item, num_runs=3)
-        classifications[item] = {
-            'category': 'PARTS' if category == 'PARTS' else 'INSPECTION',
-            'confidence': confidence
+    # פריטים שמילות המפתח מכריעות אותם, או שכבר סווגו בריצות קודמות,
+    # לא נשלחים ל-Ollama
+    items_to_classify = []
+    rule_count = 0
+    for item in unique_items:
+        result = rule_classify(item)
+        if result:
+            rule_count += 1
+        else:
+            result = _cache_get(item)
+
+        if result:
+            category, confidence = result
+            classifications[item] = {
+                'category': category,
+                'confidence': confidence
+            }
+        else:
+            items_to_classify.append(item)
+
+    print(f"📏 {rule_count} item(s) classified by keyword rules")
+    print(f"💾 {len(classifications) - rule_count} item(s) found in cache, "
+          f"{len(items_to_classify)} to classify")
+
+    # הבקשות ל-Ollama חוסמות על רשת - שולחים כמה אצוות במקביל
+    with ThreadPoolExecutor(max_workers=OLLAMA_NUM_PARALLEL) as executor:
+        futures = {
+            executor.submit(classify_batch, batch, 1): batch
+            for batch in chunked(items_to_classify, CLASSIFY_BATCH_SIZE)
         }
 
+        with tqdm(total=len(items_to_classify), desc="Classifying items", unit="item",
+                  mininterval=1.0, miniters=50) as pbar:
+            for future in as_completed(futures):
+                batch = futures[future]
+                for item, (category, confidence) in zip(batch, future.result()):
+                    classifications[item] = {
+                        'category': category,
+                        'confidence': confidence
+                    }
+                    if category != 'ERROR':
+                        _cache_set(item, category, confidence)
+                pbar.update(len(batch))
+
+    _get_cache_connection().commit()
+
     return classifications
 
 
@@ -216,8 +451,11 @@ def load_json_files(folder_path):
     all_data = []
     for json_file in sorted(json_files):
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # mmap - הפענוח קורא ישירות מהקובץ הממופה, בלי עותק נוסף של הבתים בזיכרון
+            with open(json_file, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                    memoryview(mm) as buf:
+                data = orjson.loads(buf)
                 all_data.append({
                     'filename': os.path.basename(json_file),
                     'data': data
@@ -229,15 +467,13 @@ def load_json_files(folder_path):
     return all_data
 
 
-def extract_model_variants(json_file_data):
+def iter_variant_items(json_file_data):
     """
-    חלץ את כל וריאנטי הדגמים מ-JSON
-    נרמל שמות דגמים לפני קיבוץ (הסר / / כפולים)
+    עבור על כל הפריטים ב-JSON בלי לבנות מבנה ביניים
+    נרמל שמות דגמים (הסר / / כפולים)
 
-    החזר: {model_variant_name: {service_key: [items]}}
+    yield: (model_variant_name, service_key, item)
     """
-    model_variants = defaultdict(lambda: defaultdict(list))
-
     for service_key, models_dict in json_file_data.items():
         if isinstance(models_dict, dict):
             for model_name, items_list in models_dict.items():
@@ -246,22 +482,20 @@ def extract_model_variants(json_file_data):
 
                 if isinstance(items_list, list):
                     for item in items_list:
-                        model_variants[normalized_model_name][service_key].append(item)
+                        yield normalized_model_name, service_key, item
 
-    return dict(model_variants)
 
-
-def process_json_file(json_file_info, classifications, output_base_path):
+def process_json_file(json_file_info, classifications, parts_set, error_set, output_base_path):
     """
     עבדו קובץ JSON בודד - עם DEBUG
     1. חלץ וריאנטי דגמים
     2. לכל וריאנט, צור קובץ output בנפרד
+    parts_set / error_set - קבוצות פריטים מחושבות מראש לספירה מהירה לפי קטגוריה
     """
     json_filename = json_file_info['filename']
-    json_data = json_file_info['data']
 
-    # חלץ וריאנטי דגמים (עם נורמליזציה)
-    model_variants = extract_model_variants(json_data)
+    # וריאנטי דגמים (עם נורמליזציה) - נבנו כבר במעבר ה-deduplication
+    model_variants = json_file_info['variants']
 
     print(f"\n{'=' * 80}")
     print(f"📄 Processing: {json_filename}")
@@ -283,7 +517,8 @@ def process_json_file(json_file_info, classifications, output_base_path):
         os.makedirs(model_folder, exist_ok=True)
 
         # Progress bar לעיבוד השירותים
-        pbar = tqdm(total=len(services_dict), desc=f"  Processing services", unit="service")
+        pbar = tqdm(total=len(services_dict), desc=f"  Processing services", unit="service",
+                    mininterval=1.0, miniters=50)
 
         # בנה את ה-output structure
         classified_output = {
@@ -296,47 +531,44 @@ def process_json_file(json_file_info, classifications, output_base_path):
             'services': {}
         }
 
-        parts_items = []
-        inspection_items = []
+        parts_count = 0
+        error_count = 0
         missing_items_count = 0
 
         for service_key, items_list in services_dict.items():
-            print(f"    Processing {service_key}: {len(items_list)} items")
+            service_items = []
+            append = service_items.append
+            service_parts = 0
+            service_errors = 0
+
+            for item in items_list:
+                classification = classifications.get(item)
+                if classification is None:
+                    # פריט לא נמצא בסיווגים - מדווח כסיכום בסוף הוריאנט
+                    missing_items_count += 1
+                    continue
+
+                append({
+                    'text': item,
+                    'category': classification['category'],
+                    'confidence': classification['confidence']
+                })
+                if item in parts_set:
+                    service_parts += 1
+                elif item in error_set:
+                    service_errors += 1
 
             classified_output['services'][service_key] = {
-                'items': [],
+                'items': service_items,
                 'summary': {
-                    'total': 0,
-                    'parts': 0,
-                    'inspection': 0
+                    'total': len(service_items),
+                    'parts': service_parts,
+                    'inspection': len(service_items) - service_parts - service_errors,
+                    'errors': service_errors
                 }
             }
-
-            for item in items_list:
-                if item in classifications:
-                    classification = classifications[item]
-                    category = classification['category']
-                    confidence = classification['confidence']
-
-                    item_entry = {
-                        'text': item,
-                        'category': category,
-                        'confidence': confidence
-                    }
-
-                    classified_output['services'][service_key]['items'].append(item_entry)
-                    classified_output['services'][service_key]['summary']['total'] += 1
-
-                    if category == 'PARTS':
-                        classified_output['services'][service_key]['summary']['parts'] += 1
-                        parts_items.append(item_entry)
-                    else:
-                        classified_output['services'][service_key]['summary']['inspection'] += 1
-                        inspection_items.append(item_entry)
-                else:
-                    # DEBUG: פריט לא נמצא בסיווגים
-                    print(f"      ⚠️  Item not in classifications: {item[:50]}...")
-                    missing_items_count += 1
+            parts_count += service_parts
+            error_count += service_errors
 
             pbar.update(1)
 
@@ -345,15 +577,15 @@ def process_json_file(json_file_info, classifications, output_base_path):
         if missing_items_count > 0:
             print(f"  ⚠️  Total missing items: {missing_items_count}")
 
-        # מיון לפי confidence
-        parts_items.sort(key=lambda x: x['confidence'], reverse=True)
-        inspection_items.sort(key=lambda x: x['confidence'], reverse=True)
-
-        classified_output['metadata']['total_items'] = sum(
+        total_items = sum(
             s['summary']['total'] for s in classified_output['services'].values()
         )
-        classified_output['metadata']['parts_count'] = len(parts_items)
-        classified_output['metadata']['inspection_count'] = len(inspection_items)
+        inspection_count = total_items - parts_count - error_count
+
+        classified_output['metadata']['total_items'] = total_items
+        classified_output['metadata']['parts_count'] = parts_count
+        classified_output['metadata']['inspection_count'] = inspection_count
+        classified_output['metadata']['error_count'] = error_count
 
         # שמור קבצים
 
@@ -362,8 +594,8 @@ def process_json_file(json_file_info, classifications, output_base_path):
             model_folder,
             f"{safe_variant_name}_classified.json"
         )
-        # with open(main_output_file, 'w', encoding='utf-8') as f:
-        #     json.dump(classified_output, f, ensure_ascii=False, indent=2)
+        # with open(main_output_file, 'wb') as f:
+        #     f.write(orjson.dumps(classified_output, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
         # print(f"  ✅ Saved: {os.path.basename(main_output_file)}")
         #
         # # 2. קובץ parts בלבד
@@ -371,8 +603,10 @@ def process_json_file(json_file_info, classifications, output_base_path):
         #     model_folder,
         #     f"{safe_variant_name}_parts_only.json"
         # )
-        # with open(parts_output_file, 'w', encoding='utf-8') as f:
-        #     json.dump(parts_items, f, ensure_ascii=False, indent=2)
+        # parts_items = [entry for service in classified_output['services'].values()
+        #                for entry in service['items'] if entry['category'] == 'PARTS']
+        # with open(parts_output_file, 'wb') as f:
+        #     f.write(orjson.dumps(parts_items, option=orjson.OPT_INDENT_2))
         # print(f"  ✅ Saved: {os.path.basename(parts_output_file)}")
         #
         # # 3. קובץ inspection בלבד
@@ -380,15 +614,19 @@ def process_json_file(json_file_info, classifications, output_base_path):
         #     model_folder,
         #     f"{safe_variant_name}_inspection_only.json"
         # )
-        # with open(inspection_output_file, 'w', encoding='utf-8') as f:
-        #     json.dump(inspection_items, f, ensure_ascii=False, indent=2)
+        # inspection_items = [entry for service in classified_output['services'].values()
+        #                     for entry in service['items'] if entry['category'] == 'INSPECTION']
+        # with open(inspection_output_file, 'wb') as f:
+        #     f.write(orjson.dumps(inspection_items, option=orjson.OPT_INDENT_2))
         # print(f"  ✅ Saved: {os.path.basename(inspection_output_file)}")
 
         # סיכום
         print(f"\n  📊 Summary for {variant_name}:")
         print(f"     Total items: {classified_output['metadata']['total_items']}")
-        print(f"     Parts: {len(parts_items)}")
-        print(f"     Inspection: {len(inspection_items)}")
+        print(f"     Parts: {parts_count}")
+        print(f"     Inspection: {inspection_count}")
+        if error_count:
+            print(f"     ⚠️  Errors: {error_count}")
 
 
 def main():
@@ -428,8 +666,11 @@ def main():
 
     # Deduplicate items across all JSONs
     print("\n🔍 Deduplicating items across all JSON files...")
-    all_json_data = [item['data'] for item in all_json_files]
-    unique_items = deduplicate_items(all_json_data)
+    unique_items = deduplicate_items(all_json_files)
+
+    # ה-JSON הגולמי כבר לא נחוץ - הווריאנטים קובצו ב-deduplicate_items
+    for json_file_info in all_json_files:
+        del json_file_info['data']
 
     print(f"✅ Found {len(unique_items)} unique items to classify")
 
@@ -439,10 +680,12 @@ def main():
     # DEBUG: הראה כמה פריטים סווגו
     print(f"\n🔍 DEBUG - Classifications summary:")
     print(f"   Total classifications: {len(classifications)}")
-    parts_count = sum(1 for c in classifications.values() if c['category'] == 'PARTS')
-    inspection_count = sum(1 for c in classifications.values() if c['category'] == 'INSPECTION')
-    print(f"   Parts: {parts_count}")
-    print(f"   Inspection: {inspection_count}")
+    parts_set = frozenset(it for it, c in classifications.items() if c['category'] == 'PARTS')
+    error_set = frozenset(it for it, c in classifications.items() if c['category'] == 'ERROR')
+    print(f"   Parts: {len(parts_set)}")
+    print(f"   Inspection: {len(classifications) - len(parts_set) - len(error_set)}")
+    if error_set:
+        print(f"   ⚠️  Errors: {len(error_set)}")
 
     # Create output directory structure
     output_base_path = "Classification Results"
@@ -454,7 +697,7 @@ def main():
     print(f"{'=' * 80}")
 
     for json_file_info in all_json_files:
-        process_json_file(json_file_info, classifications, output_base_path)
+        process_json_file(json_file_info, classifications, parts_set, error_set, output_base_path)
 
     # Summary
     print(f"\n{'=' * 80}")
@@ -10,11 +10,14 @@
 - תמיכה ב-VIN או הזנה ידנית של דגם
 """
 
-import json
+import orjson
 import re
 import argparse
-from difflib import SequenceMatcher
+from functools import lru_cache
 from pathlib import Path
+import numpy as np
+import ahocorasick
+from rapidfuzz import fuzz, process
 from oil_capacity_config import get_oil_capacity
 from SmartVinDecoder import SmartVinDecoder
 
@@ -26,20 +29,53 @@ OUTPUT_PATH = Path("outputs/Service_Parts_Matched.json")
 
 # ---------- Utilities ----------
 
+_NONALNUM_RE = re.compile(r"[^a-z0-9 ]+")
+_WS_RE = re.compile(r"\s+")
+_X_VERSION_RE = re.compile(r'\bX(\d+)\b')
+
+
+@lru_cache(maxsize=8192)
 def clean(text: str) -> str:
-    """ניקוי טקסט להשוואה"""
+    """ניקוי טקסט להשוואה (ממוטמן - אותן שורות חוזרות בין services ודגמים)"""
     text = (text or "").lower()
-    text = re.sub(r"[^a-z0-9 ]+", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
+    text = _NONALNUM_RE.sub(" ", text)
+    text = _WS_RE.sub(" ", text).strip()
     return text
 
 
+def clean_pet_descriptions(pet_rows: list) -> list:
+    """clean() לתיאור של כל שורת PET - פעם אחת, מקביל ל-pet_rows"""
+    return [clean(row.get('Description', '')) for row in pet_rows]
+
+
+def tag_pet_rows(pet_rows: list, pet_descs_clean: list = None) -> dict:
+    """
+    מעבר אחד על שורות ה-PET ומיונן לפי התגיות של הכללים המיוחדים (בסדר המקורי)
+    engine_oil - זוגות (שורה, גירסת X), שאר התגיות - רשימת שורות
+    """
+    if pet_descs_clean is None:
+        pet_descs_clean = clean_pet_descriptions(pet_rows)
+    pet_by_tag = {"engine_oil": [], "oil_filter_with_seal": [],
+                  "air_filter": [], "odour_allergen": []}
+    for row, desc_clean in zip(pet_rows, pet_descs_clean):
+        if "engine oil" in desc_clean:
+            pet_by_tag["engine_oil"].append((row, extract_x_version(row.get('Description', ''))))
+        if "oil filter" in desc_clean and "with seal" in desc_clean:
+            pet_by_tag["oil_filter_with_seal"].append(row)
+        if "air filter element" in desc_clean:
+            pet_by_tag["air_filter"].append(row)
+        if ("odour" in desc_clean and "allergen" in desc_clean and "filter" in desc_clean) or \
+                ("odour and allergen filter" in desc_clean):
+            pet_by_tag["odour_allergen"].append(row)
+    return pet_by_tag
+
+
 def extract_x_version(description: str) -> int:
     """
     מחלץ את מספר הגירסה של X (למשל X3, X4, X10)
     מחזיר -1 אם לא נמצא X
     """
-    match = re.search(r'\bX(\d+)\b', description)
+    match = _X_VERSION_RE.search(description)
     if match:
         return int(match.group(1))
     return -1
@@ -100,20 +136,32 @@ KEYWORDS = [
 ]
 
 
+# אוטומט Aho-Corasick - כל מילות המפתח נמצאות במעבר אחד על הטקסט
+_KEYWORD_AUTOMATON = ahocorasick.Automaton()
+for _kw_idx, _kw in enumerate(KEYWORDS):
+    _KEYWORD_AUTOMATON.add_word(_kw, _kw_idx)
+_KEYWORD_AUTOMATON.make_automaton()
+
+
+@lru_cache(maxsize=8192)
+def keyword_mask(text: str) -> int:
+    """bitmask של מילות המפתח שמופיעות בטקסט (ביט i = KEYWORDS[i])"""
+    mask = 0
+    for _, kw_idx in _KEYWORD_AUTOMATON.iter(text):
+        mask |= 1 << kw_idx
+    return mask
+
+
 def keyword_score(a: str, b: str) -> float:
     """ניקוד לפי מילות מפתח משותפות"""
-    score = 0.0
-    for kw in KEYWORDS:
-        if kw in a and kw in b:
-            score += 3.0
-        elif kw in a or kw in b:
-            score += 0.5
-    return score
+    mask_a, mask_b = keyword_mask(a), keyword_mask(b)
+    # 3 למילה בשניהם, 0.5 למילה באחד בלבד
+    return 3.0 * (mask_a & mask_b).bit_count() + 0.5 * (mask_a ^ mask_b).bit_count()
 
 
 def similarity_score(a: str, b: str) -> float:
     """ניקוד דמיון בין מחרוזות"""
-    return SequenceMatcher(None, a, b).ratio()
+    return fuzz.ratio(a, b) / 100.0
 
 
 def score_match(service_line: str, pet_desc: str) -> float:
@@ -122,14 +170,42 @@ def score_match(service_line: str, pet_desc: str) -> float:
     return similarity_score(a, b) * 5.0 + keyword_score(a, b)
 
 
+def keyword_matrix(texts: list) -> np.ndarray:
+    """מטריצת הופעה (טקסט x מילת מפתח) של KEYWORDS"""
+    masks = np.array([keyword_mask(t) for t in texts], dtype=np.int64)
+    return ((masks[:, None] >> np.arange(len(KEYWORDS))) & 1).astype(np.float64)
+
+
+def score_matrix(service_lines_clean: list, pet_descs_clean: list) -> np.ndarray:
+    """
+    ציון כולל לכל הזוגות (שורת שירות x שורת PET) בבת אחת
+    זהה ל-score_match: דמיון * 5 + keyword_score
+    (3 למילה בשניהם, 0.5 למילה באחד בלבד = 0.5 * (a + b) + 2 * (a AND b))
+    """
+    similarity = process.cdist(service_lines_clean, pet_descs_clean,
+                               scorer=fuzz.ratio, dtype=np.float64, workers=-1) / 100.0
+    a = keyword_matrix(service_lines_clean)
+    b = keyword_matrix(pet_descs_clean)
+    keywords = 0.5 * (a.sum(axis=1)[:, None] + b.sum(axis=1)[None, :]) + 2.0 * (a @ b.T)
+    return similarity * 5.0 + keywords
+
+
 # ---------- כללי התאמה מיוחדים ----------
 
-def apply_special_matching_rules(service_line: str, pet_rows: list, model_name: str):
+def apply_special_matching_rules(service_line: str, pet_rows: list, model_name: str,
+                                 service_clean: str = None, pet_descs_clean: list = None,
+                                 pet_by_tag: dict = None):
     """
     מיישם כללי התאמה מיוחדים לפי דגם ותיאור השורה
     מחזיר רשימה של התאמות או None
+    service_clean - השורה אחרי clean(), אם כבר חושבה
+    pet_descs_clean - תיאורי ה-PET אחרי clean() (מקביל ל-pet_rows), אם כבר חושבו
+    pet_by_tag - שורות ה-PET לפי תגית (מ-tag_pet_rows), אם כבר חושבו
     """
-    service_clean = clean(service_line)
+    if service_clean is None:
+        service_clean = clean(service_line)
+    if pet_by_tag is None:
+        pet_by_tag = tag_pet_rows(pet_rows, pet_descs_clean)
     model_upper = model_name.upper()
 
     # זיהוי אם מדובר ב-PANAMERA או CAYENNE
@@ -138,21 +214,11 @@ def apply_special_matching_rules(service_line: str, pet_rows: list, model_name:
 
     # כלל מיוחד: Fill in engine oil - בחירת הגירסה הגבוהה ביותר של X
     if "fill in engine oil" in service_clean or "fill engine oil" in service_clean:
-        engine_oil_candidates = []
-        for row in pet_rows:
-            desc = row.get('Description', '')
-            desc_clean = clean(desc)
-            if "engine oil" in desc_clean:
-                x_version = extract_x_version(desc)
-                engine_oil_candidates.append({
-                    "row": row,
-                    "x_version": x_version
-                })
+        engine_oil_candidates = pet_by_tag["engine_oil"]
 
         # בחירת השורה עם ה-X הגבוה ביותר
         if engine_oil_candidates:
-            best_candidate = max(engine_oil_candidates, key=lambda x: x["x_version"])
-            best_row = best_candidate["row"]
+            best_row = max(engine_oil_candidates, key=lambda x: x[1])[0]
 
             # קבלת הכמות המתאימה לדגם
             oil_capacity = get_oil_capacity(model_name)
@@ -171,72 +237,80 @@ def apply_special_matching_rules(service_line: str, pet_rows: list, model_name:
     if (is_panamera or is_cayenne) and "change oil filter" in service_clean:
         # חיפוש "oil filter, with seal"
         matched_parts = []
-        for row in pet_rows:
-            desc_clean = clean(row.get('Description', ''))
-            if "oil filter" in desc_clean and "with seal" in desc_clean:
-                matched_parts.append({
-                    "SERVICE LINE": service_line,
-                    "PART NUMBER": row.get("Part Number", "").strip(),
-                    "DESCRIPTION": row.get("Description", "").strip(),
-                    "REMARK": row.get("Remark", "").strip(),
-                    "QUANTITY": row.get("Qty", "").strip(),
-                })
-
-                # הוספת המק"טים הנוספים
-                matched_parts.append({
-                    "SERVICE LINE": service_line + " (פקק לאגן שמן)",
-                    "PART NUMBER": "PAF911679",
-                    "DESCRIPTION": "Oil drain plug",
-                    "REMARK": "פקק לאגן שמן",
-                    "QUANTITY": "1",
-                })
-
-                matched_parts.append({
-                    "SERVICE LINE": service_line + " (שייבה לאגן שמן)",
-                    "PART NUMBER": "PAF013849",
-                    "DESCRIPTION": "Oil drain washer",
-                    "REMARK": "שייבה לאגן שמן",
-                    "QUANTITY": "1",
-                })
-
-                return matched_parts
+        if pet_by_tag["oil_filter_with_seal"]:
+            row = pet_by_tag["oil_filter_with_seal"][0]
+            matched_parts.append({
+                "SERVICE LINE": service_line,
+                "PART NUMBER": row.get("Part Number", "").strip(),
+                "DESCRIPTION": row.get("Description", "").strip(),
+                "REMARK": row.get("Remark", "").strip(),
+                "QUANTITY": row.get("Qty", "").strip(),
+            })
+
+            # הוספת המק"טים הנוספים
+            matched_parts.append({
+                "SERVICE LINE": service_line + " (פקק לאגן שמן)",
+                "PART NUMBER": "PAF911679",
+                "DESCRIPTION": "Oil drain plug",
+                "REMARK": "פקק לאגן שמן",
+                "QUANTITY": "1",
+            })
+
+            matched_parts.append({
+                "SERVICE LINE": service_line + " (שייבה לאגן שמן)",
+                "PART NUMBER": "PAF013849",
+                "DESCRIPTION": "Oil drain washer",
+                "REMARK": "שייבה לאגן שמן",
+                "QUANTITY": "1",
+            })
+
+            return matched_parts
 
     # כלל 2: עבור כל הדגמים - Air cleaner: replace filter element
     if "air cleaner" in service_clean and "replace filter element" in service_clean:
-        for row in pet_rows:
-            desc_clean = clean(row.get('Description', ''))
-            if "air filter element" in desc_clean:
-                return [{
-                    "SERVICE LINE": service_line,
-                    "PART NUMBER": row.get("Part Number", "").strip(),
-                    "DESCRIPTION": row.get("Description", "").strip(),
-                    "REMARK": row.get("Remark", "").strip(),
-                    "QUANTITY": row.get("Qty", "").strip(),
-                }]
+        if pet_by_tag["air_filter"]:
+            row = pet_by_tag["air_filter"][0]
+            return [{
+                "SERVICE LINE": service_line,
+                "PART NUMBER": row.get("Part Number", "").strip(),
+                "DESCRIPTION": row.get("Description", "").strip(),
+                "REMARK": row.get("Remark", "").strip(),
+                "QUANTITY": row.get("Qty", "").strip(),
+            }]
 
     # כלל 3: עבור כל הדגמים - Particle filter: replace filter element
     if "particle filter" in service_clean and "replace filter element" in service_clean:
-        for row in pet_rows:
-            desc_clean = clean(row.get('Description', ''))
-            if ("odour" in desc_clean and "allergen" in desc_clean and "filter" in desc_clean) or \
-                    ("odour and allergen filter" in desc_clean):
-                return [{
-                    "SERVICE LINE": service_line,
-                    "PART NUMBER": row.get("Part Number", "").strip(),
-                    "DESCRIPTION": row.get("Description", "").strip(),
-                    "REMARK": row.get("Remark", "").strip(),
-                    "QUANTITY": row.get("Qty", "").strip(),
-                }]
+        if pet_by_tag["odour_allergen"]:
+            row = pet_by_tag["odour_allergen"][0]
+            return [{
+                "SERVICE LINE": service_line,
+                "PART NUMBER": row.get("Part Number", "").strip(),
+                "DESCRIPTION": row.get("Description", "").strip(),
+                "REMARK": row.get("Remark", "").strip(),
+                "QUANTITY": row.get("Qty", "").strip(),
+            }]
 
     return None
 
 
-def best_pet_match(service_line: str, pet_rows: list, model_name: str = "", min_score: float = 2.0):
+def best_pet_match(service_line: str, pet_rows: list, model_name: str = "", min_score: float = 2.0,
+                   scores=None, service_clean: str = None, pet_descs_clean: list = None,
+                   pet_by_tag: dict = None):
     """
     מחזיר את ההתאמה הטובה ביותר עם תמיכה בכללים מיוחדים
+    scores - שורת ציונים מחושבת מראש מול pet_rows (מ-score_matrix), אם יש
+    service_clean - השורה אחרי clean(), אם כבר חושבה
+    pet_descs_clean - תיאורי ה-PET אחרי clean() (מקביל ל-pet_rows), אם כבר חושבו
+    pet_by_tag - שורות ה-PET לפי תגית (מ-tag_pet_rows), אם כבר חושבו
     """
+    if service_clean is None:
+        service_clean = clean(service_line)
+    if pet_descs_clean is None:
+        pet_descs_clean = clean_pet_descriptions(pet_rows)
+
     # בדיקה אם יש כלל מיוחד
-    special_match = apply_special_matching_rules(service_line, pet_rows, model_name)
+    special_match = apply_special_matching_rules(service_line, pet_rows, model_name,
+                                                 service_clean, pet_descs_clean, pet_by_tag)
     if special_match:
         return special_match
 
@@ -244,13 +318,12 @@ def best_pet_match(service_line: str, pet_rows: list, model_name: str = "", min_
     best = None
     best_sc = -1.0
 
-    for row in pet_rows:
-        desc = row.get('Description', '')
-        sc = score_match(service_line, desc)
-
-        if sc > best_sc:
-            best_sc = sc
-            best = row
+    if pet_rows:
+        if scores is None:
+            scores = score_matrix([service_clean], pet_descs_clean)[0]
+        best_idx = int(np.argmax(scores))
+        best_sc = float(scores[best_idx])
+        best = pet_rows[best_idx]
 
     if best_sc >= min_score and best:
         return [{
@@ -306,12 +379,15 @@ def main():
         raise FileNotFoundError(f"PET lines not found: {pet_path}")
 
     # טעינת הקובץ המסווג
-    with service_path.open("r", encoding="utf-8") as f:
-        classified_data = json.load(f)
+    classified_data = orjson.loads(service_path.read_bytes())
 
     # טעינת PET
-    with pet_path.open("r", encoding="utf-8") as f:
-        pet_rows = json.load(f)
+    pet_rows = orjson.loads(pet_path.read_bytes())
+
+    # ניקוי תיאורי ה-PET פעם אחת לכל הריצה
+    pet_descs_clean = clean_pet_descriptions(pet_rows)
+    # מיון שורות ה-PET לתגיות של הכללים המיוחדים פעם אחת
+    pet_by_tag = tag_pet_rows(pet_rows, pet_descs_clean)
 
     # קבלת שם הדגם מהמשתמש
     model_name = get_model_from_user(args)
@@ -329,20 +405,37 @@ def main():
         print(f"⚠️  No oil capacity defined for {model_name}")
 
     output = {}
+    services = classified_data.get("services", {})
 
-    # עבור כל service (15000, 30000 וכו')
-    for service_key, service_data in classified_data.get("services", {}).items():
-        matched_parts = []
-
-        # עבור כל item ב-service
+    # מעבר אחד על ה-items: שורות PARTS לכל service + clean() פעם אחת לכל שורה ייחודית
+    parts_by_service = {}
+    cleaned_lines = {}
+    for service_key, service_data in services.items():
+        service_lines = parts_by_service[service_key] = []
         for item in service_data.get("items", []):
             # רק אם הקטגוריה היא PARTS
             if item.get("category") == "PARTS":
                 service_line = item.get("text", "")
+                service_lines.append(service_line)
+                if service_line not in cleaned_lines:
+                    cleaned_lines[service_line] = clean(service_line)
+
+    # ניקוד כל שורות ה-PARTS מול כל שורות ה-PET בקריאה וקטורית אחת
+    all_scores = score_matrix(list(cleaned_lines.values()), pet_descs_clean)
+    line_scores = dict(zip(cleaned_lines, all_scores))
+
+    # עבור כל service (15000, 30000 וכו')
+    for service_key, service_lines in parts_by_service.items():
+        matched_parts = []
 
-                # התאמה מול PET
-                matches = best_pet_match(service_line, pet_rows, model_name)
-                matched_parts.extend(matches)
+        for service_line in service_lines:
+            # התאמה מול PET
+            matches = best_pet_match(service_line, pet_rows, model_name,
+                                     scores=line_scores[service_line],
+                                     service_clean=cleaned_lines[service_line],
+                                     pet_descs_clean=pet_descs_clean,
+                                     pet_by_tag=pet_by_tag)
+            matched_parts.extend(matches)
 
         output[service_key] = {
             "model": model_name,
@@ -353,8 +446,8 @@ def main():
 
     # שמירה
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with output_path.open("w", encoding="utf-8") as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+    with output_path.open("wb") as f:
+        f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
 
     print(f"\n✅ Done! Output saved to: {output_path}")
     print(f"📊 Model: {model_name}")
@@ -26,6 +26,9 @@ SERVICE_ORDER = [
     "service_time_dependent"
 ]
 
+# תבנית תאריך (מקומפלת פעם אחת - נבדקת לכל פריט בעמוד)
+_DATE_RE = re.compile(r'^\d{1,2}/\d{1,2}/\d{2,4}$')
+
 
 def clean_with_category_logic(text: str) -> str:
     """נקה טקסט מקטגוריות מיותרות"""
@@ -54,9 +57,7 @@ def is_junk_full(text: str) -> bool:
 
 def is_real_date(text: str) -> bool:
     """בדוק אם זה תאריך אמיתי"""
-    text = text.strip()
-    date_pattern = r'^\d{1,2}/\d{1,2}/\d{2,4}$'
-    return bool(re.match(date_pattern, text))
+    return bool(_DATE_RE.match(text.strip()))
 
 
 def find_measures_position(page):